@@ -0,0 +1,115 @@
+from datetime import date
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import Integer, cast, func, literal_column, select
+from sqlalchemy.orm import Session
+import models, archive
+
+# Analysis cube: hours aggregated by any combination of worker, task, shift and
+# period. Answered with a GROUP BY over the covering index
+# (date, user_id, task, shift, amount), without touching the table.
+
+# Columns of the covering index: with archived years, the union reads only these
+CUBE_COLUMNS = ("date", "user_id", "task", "shift", "amount")
+
+DIMENSIONS = ("worker", "task", "shift")
+def _iso_week(col):
+    # ISO 8601 week ("2025-W01"): the week (Monday to Sunday) belongs to the year of its
+    # Thursday, and is numbered by that Thursday's day of the year. %G/%V would do it but
+    # need SQLite 3.46+
+    thursday = func.date(col, "-3 days", "weekday 4")
+    week = (cast(func.strftime("%j", thursday), Integer) - 1) // 7 + 1
+    return func.printf("%s-W%02d", func.strftime("%Y", thursday), week)
+
+PERIODS = {
+    "day": lambda col: func.strftime("%Y-%m-%d", col),
+    "week": lambda col: _iso_week(col),
+    "month": lambda col: func.strftime("%Y-%m", col),
+    "year": lambda col: func.strftime("%Y", col),
+}
+
+def parse_group_by(group_by: Optional[str]) -> List[str]:
+    dims = [d.strip() for d in (group_by or "").split(",") if d.strip()]
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension(s): {', '.join(unknown)}. Use {', '.join(DIMENSIONS)}")
+    return list(dict.fromkeys(dims))
+
+def build_query(
+    dims: List[str],
+    period: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_id: Optional[int] = None,
+    task: Optional[str] = None,
+    shift: Optional[str] = None,
+):
+    """Cube GROUP BY, without worker names. Returns (query, keys)."""
+    entry = archive.entries(date_from, columns=CUBE_COLUMNS).c
+    keys = []
+    if "worker" in dims:
+        # "+ 0": grouping by the bare column makes SQLite walk the (user_id, ...)
+        # indexes for the ordering, with a table lookup per row. With the expression
+        # it always uses the covering index, with or without a date range
+        keys.append((entry.user_id + literal_column("0")).label("user_id"))
+    if "task" in dims:
+        keys.append(entry.task.label("task"))
+    if "shift" in dims:
+        keys.append(entry.shift.label("shift"))
+    if period:
+        keys.append(PERIODS[period](entry.date).label("period"))
+
+    stmt = select(*keys, func.sum(entry.amount).label("hours"), func.count().label("entries"))
+    if date_from:
+        stmt = stmt.where(entry.date >= date_from)
+    if date_to:
+        stmt = stmt.where(entry.date <= date_to)
+    if user_id is not None:
+        stmt = stmt.where(entry.user_id == user_id)
+    if task:
+        stmt = stmt.where(entry.task == task)
+    if shift:
+        stmt = stmt.where(entry.shift == shift)
+    if keys:
+        stmt = stmt.group_by(*keys)
+    return stmt, keys
+
+def cube(
+    db: Session,
+    dims: List[str],
+    period: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_id: Optional[int] = None,
+    task: Optional[str] = None,
+    shift: Optional[str] = None,
+) -> dict:
+    if period is not None and period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown period. Use {', '.join(PERIODS)}")
+
+    stmt, keys = build_query(dims, period, date_from, date_to, user_id, task, shift)
+
+    if "worker" in dims:
+        # Names are joined after aggregating: one lookup per group, not per entry
+        grouped = stmt.subquery()
+        stmt = select(grouped, models.User.username, models.User.full_name).outerjoin(
+            models.User, models.User.id == grouped.c.user_id
+        )
+        order = [grouped.c[k.key] for k in keys]
+    else:
+        order = keys
+    rows = db.execute(stmt.order_by(*order)).mappings().all()
+
+    result = [
+        {**row, "hours": round(row["hours"] or 0, 2)}
+        for row in rows
+    ]
+    return {
+        "group_by": dims,
+        "period": period,
+        "rows": result,
+        "totals": {
+            "hours": round(sum(r["hours"] for r in result), 2),
+            "entries": sum(r["entries"] for r in result),
+        },
+    }
@@ -0,0 +1,214 @@
+import os
+import sys
+import time
+from datetime import date
+from typing import Optional
+from sqlalchemy import func, select, text, union_all
+from sqlalchemy.orm import Session
+import models, versioning
+
+# Archive of closed years. Entries before a cutoff year are moved from
+# work_entries to work_entries_archive, so the hot table and its indexes only hold
+# what is queried daily (current and previous month). The cutoff year is stored in
+# data_versions (scope "archive"); reads whose range starts before it read the
+# UNION ALL of both tables, the rest only the hot one.
+#
+# Monthly rollups don't change (they cover both tables), so stats and payroll
+# don't need the union. Archived entries are read-only: editing or deleting one
+# returns 404.
+#
+# Archived entries keep their id. work_entries is AUTOINCREMENT and its sequence
+# never falls below the highest archived id, so an id is never repeated across the
+# two tables (renumber_conflicts fixes older databases).
+#
+#   python archive.py run [--before-year 2024]   (cron, e.g. every January 1st)
+#   python archive.py status
+
+ARCHIVE_KEEP_YEARS = int(os.getenv("ARCHIVE_KEEP_YEARS", "1"))   # closed years kept in the hot table
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000")) # rows moved per transaction
+
+_COLUMNS = ("id", "date", "shift", "task", "amount", "created_at", "user_id")
+
+_boundary = versioning.ScopeWatch(versioning.ARCHIVE)
+
+def hot_from() -> Optional[date]:
+    """First day still in work_entries, or None if nothing is archived."""
+    year = _boundary.current()
+    return date(year, 1, 1) if year else None
+
+def needs_archive(date_from: Optional[date]) -> bool:
+    start = hot_from()
+    return start is not None and (date_from is None or date_from < start)
+
+def entries(date_from: Optional[date] = None, columns=_COLUMNS):
+    """Entries table for a range starting at date_from (None = unbounded).
+
+    Returns work_entries or, if the range reaches archived years, a UNION ALL
+    subquery with the same columns (.c.date, .c.user_id...). SQLite pushes filters
+    down into each branch, so each table uses its own indexes; but it doesn't prune
+    columns, so callers that only read some (the cube, with its covering index)
+    pass them in columns.
+    """
+    if not needs_archive(date_from):
+        return models.WorkEntry.__table__
+    return union_all_entries(columns)
+
+def union_all_entries(columns=_COLUMNS):
+    hot = models.WorkEntry.__table__
+    cold = models.WorkEntryArchive.__table__
+    return union_all(
+        select(*(hot.c[name] for name in columns)),
+        select(*(cold.c[name] for name in columns)),
+    ).subquery("all_entries")
+
+def latest(limit: int, include_archive: Optional[bool] = None):
+    """The limit most recently created entries (with a worker), from both tables.
+
+    An entry created today may already be archived (an import of closed years), so
+    the newest limit rows of each table are unioned, each through its created_at
+    index.
+    """
+    if include_archive is None:
+        include_archive = hot_from() is not None
+
+    def newest(table):
+        return select(*(table.c[name] for name in _COLUMNS)).where(
+            table.c.user_id.isnot(None)
+        ).order_by(table.c.created_at.desc()).limit(limit).subquery()
+
+    parts = [newest(models.WorkEntry.__table__)]
+    if include_archive:
+        parts.append(newest(models.WorkEntryArchive.__table__))
+    merged = union_all(*(select(part) for part in parts)).subquery("newest_entries")
+    return select(merged).order_by(merged.c.created_at.desc()).limit(limit).subquery("latest_entries")
+
+def count(db: Session) -> int:
+    total = db.scalar(select(func.count()).select_from(models.WorkEntry))
+    if hot_from() is not None:
+        total += db.scalar(select(func.count()).select_from(models.WorkEntryArchive))
+    return total
+
+def _sequence(db: Session) -> int:
+    # sqlite_sequence only exists if some table is AUTOINCREMENT
+    if db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'")).first() is None:
+        return 0
+    return db.scalar(text("SELECT seq FROM sqlite_sequence WHERE name = 'work_entries'")) or 0
+
+def sync_sequence(db: Session):
+    """Moves the work_entries sequence above every id, hot and archived."""
+    top = max(
+        _sequence(db),
+        db.scalar(select(func.max(models.WorkEntry.id))) or 0,
+        db.scalar(select(func.max(models.WorkEntryArchive.id))) or 0,
+    )
+    db.execute(text("DELETE FROM sqlite_sequence WHERE name = 'work_entries'"))
+    db.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('work_entries', :seq)"), {"seq": top})
+    return top
+
+def renumber_conflicts(db: Session) -> int:
+    """Gives a new id to archived entries whose id is already used by a hot entry.
+
+    Happens in databases from before AUTOINCREMENT, where SQLite reused the highest
+    ids once they were archived. The archived (read-only) entry is renumbered, not
+    the editable one; new ids come from the work_entries sequence.
+    """
+    hot = models.WorkEntry.__table__
+    cold = models.WorkEntryArchive.__table__
+    clashes = db.execute(
+        select(cold.c.id, cold.c.user_id).where(cold.c.id.in_(select(hot.c.id))).order_by(cold.c.id)
+    ).all()
+    if not clashes:
+        return 0
+    top = max(
+        _sequence(db),
+        db.scalar(select(func.max(hot.c.id))) or 0,
+        db.scalar(select(func.max(cold.c.id))) or 0,
+    )
+    for offset, (old_id, _) in enumerate(clashes, start=1):
+        db.execute(cold.update().where(cold.c.id == old_id).values(id=top + offset))
+    if _sequence(db):
+        db.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'work_entries'"), {"seq": top + len(clashes)})
+    for user_id in {user_id for _, user_id in clashes}:
+        versioning.bump(db, user_id)
+    return len(clashes)
+
+def delete_user(db: Session, user_id: int):
+    # Same as their hot entries: they become anonymous (user_id NULL), so a new
+    # user that gets the same id doesn't see them
+    cold = models.WorkEntryArchive.__table__
+    db.execute(cold.update().where(cold.c.user_id == user_id).values(user_id=None))
+
+def run(db: Session, before_year: int = None) -> dict:
+    """Moves entries before before_year to work_entries_archive.
+
+    By default every closed year is archived except the last ARCHIVE_KEEP_YEARS.
+    The cutoff year is published first (reads start unioning both tables) and then
+    rows are moved in batches: each batch copies and deletes in the same
+    transaction, so a row is never in both tables or in neither, and writers only
+    wait for one batch. It can be re-run: it also picks up entries for already
+    archived years created later. Before moving anything, ids repeated across the
+    two tables are renumbered (renumber_conflicts).
+    """
+    before_year = before_year or date.today().year - ARCHIVE_KEEP_YEARS
+    if before_year > date.today().year:
+        raise ValueError("Only closed years can be archived")
+
+    start = time.perf_counter()
+    before_year = max(before_year, versioning.get(db, versioning.ARCHIVE))
+    versioning.advance(db, versioning.ARCHIVE, before_year)
+    renumbered = renumber_conflicts(db)
+    db.commit()
+
+    hot = models.WorkEntry.__table__
+    cold = models.WorkEntryArchive.__table__
+    cutoff = date(before_year, 1, 1)
+    moved = 0
+    while True:
+        ids = db.scalars(select(hot.c.id).where(hot.c.date < cutoff).limit(ARCHIVE_BATCH_SIZE)).all()
+        if not ids:
+            break
+        db.execute(cold.insert().from_select(
+            list(_COLUMNS), select(*(hot.c[name] for name in _COLUMNS)).where(hot.c.id.in_(ids))
+        ))
+        db.execute(hot.delete().where(hot.c.id.in_(ids)))
+        db.commit()
+        moved += len(ids)
+
+    return {
+        "before_year": before_year,
+        "moved": moved,
+        "renumbered": renumbered,
+        "hot_entries": db.scalar(select(func.count()).select_from(hot)),
+        "archived_entries": db.scalar(select(func.count()).select_from(cold)),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, engine
+    import migrations
+
+    parser = argparse.ArgumentParser(description="Archivo de años cerrados de work_entries")
+    parser.add_argument("command", choices=["run", "status"], nargs="?", default="status")
+    parser.add_argument("--before-year", type=int, default=None)
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    session = SessionLocal()
+    try:
+        if args.command == "run":
+            try:
+                report = run(session, args.before_year)
+            except ValueError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            print(f"✅ Archivados {report['moved']} partes anteriores a {report['before_year']} "
+                  f"en {report['seconds']}s ({report['hot_entries']} en caliente, {report['archived_entries']} archivados)")
+        else:
+            year = versioning.get(session, versioning.ARCHIVE)
+            hot = session.scalar(select(func.count()).select_from(models.WorkEntry))
+            cold = session.scalar(select(func.count()).select_from(models.WorkEntryArchive))
+            print(f"Año de corte: {year or 'ninguno'} | en caliente: {hot} | archivados: {cold}")
+    finally:
+        session.close()
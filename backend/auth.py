@@ -1,11 +1,18 @@
+import asyncio
+import threading
+import time
 import bcrypt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-import models, schemas, database
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import models, schemas, database, versioning
 
 import os
 
@@ -16,6 +23,17 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7 # 1 week
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt settings. The hashing runs in a small dedicated pool so a burst of logins
+# at shift start never blocks the event loop; beyond AUTH_HASH_QUEUE waiting jobs
+# new logins are rejected with 503 + Retry-After instead of piling up.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", "32"))
+AUTH_RETRY_AFTER = int(os.getenv("AUTH_RETRY_AFTER", "2")) # seconds
+
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(AUTH_HASH_WORKERS + AUTH_HASH_QUEUE)
+
 def verify_password(plain_password: str, hashed_password: str):
     try:
         # Si el hash viene como string (habitual en SQLite/SQLAlchemy String), pasarlo a bytes
@@ -29,7 +47,38 @@ def verify_password(plain_password: str, hashed_password: str):
         return False
 
 def get_password_hash(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def needs_rehash(hashed_password: str) -> bool:
+    # "$2b$12$..." -> cost 12. Hashes with another cost get replaced on next login
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+def hashing_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, try again shortly",
+        headers={"Retry-After": str(AUTH_RETRY_AFTER)},
+    )
+
+def _submit_hashing(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise hashing_busy_exception()
+    try:
+        future = _hash_executor.submit(fn, *args)
+    except Exception:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await asyncio.wrap_future(_submit_hashing(verify_password, plain_password, hashed_password))
+
+async def get_password_hash_async(password: str):
+    return await asyncio.wrap_future(_submit_hashing(get_password_hash, password))
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -41,7 +90,81 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+# --- Principal cache ---
+# Identity of authenticated users, keyed by token subject (username). Saves the
+# User lookup on every request. Entries expire after PRINCIPAL_CACHE_TTL seconds
+# and must be invalidated explicitly when a user is changed or deleted.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+@dataclass(frozen=True)
+class Principal:
+    # Detached snapshot of a User: safe to share between requests and threads
+    id: int
+    username: str
+    full_name: Optional[str]
+    role: str
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(id=user.id, username=user.username, full_name=user.full_name, role=user.role)
+
+class PrincipalCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username: str):
+        with self._lock:
+            item = self._entries.get(username)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._entries[username]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return item[0]
+
+    def put(self, principal: Principal):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username: Optional[str] = None):
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+# Password/role changes and deletions bump the "principals" scope; with several
+# worker processes this is what drops stale principals in the other workers
+principal_watch = versioning.ScopeWatch(versioning.PRINCIPALS, on_change=principal_cache.invalidate)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -55,10 +178,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = schemas.TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+    # Cross-worker check (principals, archive boundary) in a thread, once per request
+    await versioning.sync_watches()
+    principal = principal_cache.get(token_data.username)
+    if principal is not None:
+        return principal
+    result = await db.execute(select(models.User).where(models.User.username == token_data.username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(principal)
+    return principal
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     return current_user
@@ -0,0 +1,257 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Add current dir to sys.path to ensure imports work if run directly
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DATA_DIR, DB_PATH
+import versioning
+
+# Online backups with SQLite's backup API, without stopping the container. Pages
+# are copied in batches. In WAL mode the copy runs inside its own read
+# transaction: it is a consistent snapshot and writers never wait. In other modes
+# the lock is released between batches (if someone writes, SQLite restarts the
+# copy). Every copy is checked (quick_check), gzipped and only the BACKUP_KEEP
+# most recent are kept.
+#
+#   python backup.py create
+#   python backup.py list
+#   python backup.py verify <file>    decompresses and checks, without touching the DB
+#   python backup.py restore <file>   with the app stopped: verifies, restores and checks again
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(DATA_DIR, "backups"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "1024"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.005")) # seconds between batches (without WAL)
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "5"))
+BACKUP_GZIP_LEVEL = int(os.getenv("BACKUP_GZIP_LEVEL", "6"))
+
+PREFIX = "horas_penosas-"
+SUFFIX = ".db.gz"
+_lock = threading.Lock()
+_TABLES = ("users", "work_entries", "work_entries_archive", "monthly_rollups", "annual_rates")
+
+class _NoProgress(Exception):
+    pass
+
+def _copy(source_path: str, target_path: str, pages_per_step: int = BACKUP_PAGES_PER_STEP):
+    """Copies source into target in batches of pages. Returns the pages copied."""
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    pages = 0
+    last_remaining = None
+    restarts = 0
+
+    def progress(status, remaining, total):
+        nonlocal pages, last_remaining, restarts
+        pages = total
+        if last_remaining is not None and remaining >= last_remaining: # restarted or blocked
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _NoProgress()
+        last_remaining = remaining
+        if remaining and not snapshot:
+            time.sleep(BACKUP_STEP_SLEEP) # gap to let writers in
+
+    try:
+        snapshot = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if snapshot:
+            # Batches read from this snapshot: the copy doesn't restart when others write
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        try:
+            source.backup(target, pages=pages_per_step, progress=progress)
+        except _NoProgress:
+            # Continuous writes without WAL: the batched copy would never finish.
+            # Copy in one go (writers wait for as long as the copy takes)
+            print(f"⚠️  Backup made no progress in {restarts} steps, copying in a single step")
+            source.backup(target, pages=-1)
+        if snapshot:
+            source.execute("COMMIT")
+    finally:
+        source.close()
+        target.close()
+    return pages
+
+def _check(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        counts = {table: conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in _TABLES if table in tables}
+        return {
+            "integrity": result,
+            "schema_version": conn.execute("PRAGMA user_version").fetchone()[0],
+            "rows": counts,
+        }
+    finally:
+        conn.close()
+
+def _path(name: str) -> str:
+    # Only files in BACKUP_DIR named like a backup (no paths)
+    if os.path.basename(name) != name or not (name.startswith(PREFIX) and name.endswith(SUFFIX)):
+        raise ValueError(f"Invalid backup name: {name}")
+    path = os.path.join(BACKUP_DIR, name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Backup not found: {name}")
+    return path
+
+def _rotate():
+    for name in list_backups()[BACKUP_KEEP:]:
+        try:
+            os.remove(os.path.join(BACKUP_DIR, name["name"]))
+        except OSError:
+            pass
+
+def list_backups() -> list:
+    """Available backups, newest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = sorted((n for n in os.listdir(BACKUP_DIR) if n.startswith(PREFIX) and n.endswith(SUFFIX)), reverse=True)
+    return [{"name": n, "bytes": os.path.getsize(os.path.join(BACKUP_DIR, n))} for n in names]
+
+def create() -> dict:
+    # One backup at a time per process: several at once would only fight over the disk
+    with _lock:
+        return _create()
+
+def _create() -> dict:
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    name = f"{PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{SUFFIX}"
+    raw_path = os.path.join(BACKUP_DIR, f".{name[:-3]}.{os.getpid()}.part")
+    gz_path = os.path.join(BACKUP_DIR, f".{name}.{os.getpid()}.part")
+    try:
+        start = time.perf_counter()
+        pages = _copy(DB_PATH, raw_path)
+        copy_seconds = time.perf_counter() - start
+
+        # Self-contained file (no -wal), checked before it is kept
+        conn = sqlite3.connect(raw_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        check = _check(raw_path)
+        if check["integrity"] != "ok":
+            raise RuntimeError(f"Backup failed quick_check: {check['integrity']}")
+
+        step = time.perf_counter()
+        with open(raw_path, "rb") as src, gzip.open(gz_path, "wb", compresslevel=BACKUP_GZIP_LEVEL) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        compress_seconds = time.perf_counter() - step
+        db_bytes = os.path.getsize(raw_path)
+        os.replace(gz_path, os.path.join(BACKUP_DIR, name))
+    finally:
+        for path in (raw_path, gz_path):
+            if os.path.exists(path):
+                os.remove(path)
+    _rotate()
+
+    seconds = time.perf_counter() - start
+    return {
+        "name": name,
+        "pages": pages,
+        "db_bytes": db_bytes,
+        "bytes": os.path.getsize(os.path.join(BACKUP_DIR, name)),
+        "copy_seconds": round(copy_seconds, 3),
+        "compress_seconds": round(compress_seconds, 3),
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(db_bytes / 1024 / 1024 / seconds, 1) if seconds else None,
+        **check,
+    }
+
+@contextmanager
+def _unpacked(name: str):
+    path = _path(name)
+    raw_path = os.path.join(BACKUP_DIR, f".{name[:-3]}.{os.getpid()}-{threading.get_ident()}.verify")
+    try:
+        with gzip.open(path, "rb") as src, open(raw_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        yield raw_path
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+def verify(name: str) -> dict:
+    """Decompresses the backup into a temp file and checks integrity and contents."""
+    start = time.perf_counter()
+    with _unpacked(name) as raw_path:
+        check = _check(raw_path)
+    return {"name": name, "seconds": round(time.perf_counter() - start, 3), **check}
+
+def restore(name: str) -> dict:
+    """Replaces the DB with the backup and checks the result. Run with the app stopped.
+
+    The final check compares row counts with the backup's, so a write during the
+    restore makes it fail (and would be lost anyway when the DB is replaced). The
+    data_versions counters end up above their previous values: if a worker was
+    still running, it won't serve data that no longer exists from its cache (ETags,
+    principals).
+    """
+    start = time.perf_counter()
+    with _unpacked(name) as raw_path:
+        expected = _check(raw_path)
+        if expected["integrity"] != "ok":
+            raise RuntimeError(f"Backup failed quick_check: {expected['integrity']}")
+
+        live = sqlite3.connect(DB_PATH, isolation_level=None)
+        try:
+            before = dict(live.execute("SELECT scope, version FROM data_versions").fetchall())
+        except sqlite3.Error:
+            before = {}
+        finally:
+            live.close()
+
+        # In one go: between batches another worker could write to a half-restored DB
+        pages = _copy(raw_path, DB_PATH, pages_per_step=-1)
+
+    live = sqlite3.connect(DB_PATH)
+    try:
+        restored = dict(live.execute("SELECT scope, version FROM data_versions").fetchall())
+        for scope in set(before) | set(restored) | {versioning.GLOBAL, versioning.PRINCIPALS}:
+            if scope == versioning.ARCHIVE: # a cutoff year, not a counter
+                continue
+            live.execute(
+                "INSERT INTO data_versions (scope, version) VALUES (?, ?) "
+                "ON CONFLICT(scope) DO UPDATE SET version = excluded.version",
+                (scope, max(before.get(scope, 0), restored.get(scope, 0)) + 1),
+            )
+        live.commit()
+    finally:
+        live.close()
+
+    check = _check(DB_PATH)
+    if check["integrity"] != "ok" or check["rows"] != expected["rows"]:
+        raise RuntimeError(f"Restored database does not match the backup (was the app still writing?): {check}")
+    return {"name": name, "pages": pages, "seconds": round(time.perf_counter() - start, 3), **check}
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    try:
+        if command == "create":
+            report = create()
+            print(f"✅ {report['name']}: {report['db_bytes'] / 1024 / 1024:.1f} MB -> {report['bytes'] / 1024 / 1024:.1f} MB "
+                  f"en {report['seconds']}s ({report['mb_per_second']} MB/s, copia {report['copy_seconds']}s, "
+                  f"gzip {report['compress_seconds']}s) | {report['rows']}")
+        elif command in ("verify", "restore") and len(sys.argv) > 2:
+            if command == "restore":
+                print("⚠️  La aplicación debe estar parada durante la restauración (p.ej. docker compose stop): "
+                      "lo que se escriba mientras tanto se pierde y la comprobación final fallaría")
+            report = (verify if command == "verify" else restore)(sys.argv[2])
+            print(f"✅ {report['name']}: integridad {report['integrity']}, esquema v{report['schema_version']}, "
+                  f"{report['seconds']}s | {report['rows']}")
+        elif command == "list":
+            for item in list_backups():
+                print(f"   {item['name']}  {item['bytes'] / 1024 / 1024:.1f} MB")
+            print(f"Copias en {BACKUP_DIR} (se guardan {BACKUP_KEEP})")
+        else:
+            print("Uso: python backup.py create | list | verify <fichero> | restore <fichero>")
+    except (ValueError, FileNotFoundError, RuntimeError, sqlite3.Error) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,129 @@
+import os
+from datetime import datetime
+from typing import Iterable, Tuple
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+import models, schemas, rollups, versioning
+
+# Creates, edits and deletes of a worker's entries in a single request. All or
+# nothing: if any operation is invalid none is written. Otherwise they are applied
+# with one statement per kind (DELETE ... IN, UPDATE executemany, INSERT
+# executemany), a single rollup upsert and one commit.
+
+ENTRY_BATCH_MAX = int(os.getenv("ENTRY_BATCH_MAX", "1000"))
+
+def _parse(rows: Iterable[Tuple[int, dict]], report: schemas.EntryBatchReport):
+    ops, seen = [], {}
+    for number, raw in rows:
+        try:
+            op = schemas.EntryBatchOperation(**raw)
+        except (TypeError, ValidationError) as e:
+            detail = str(e)
+            if isinstance(e, ValidationError):
+                error = e.errors()[0]
+                detail = f"{'.'.join(str(p) for p in error['loc'])}: {error['msg']}"
+            report.results.append(schemas.EntryBatchResult(row=number, status="failed", detail=detail))
+            continue
+
+        detail = None
+        if op.op != "create" and op.id is None:
+            detail = f"id: required for {op.op}"
+        elif op.op != "delete" and op.entry is None:
+            detail = f"entry: required for {op.op}"
+        elif op.op == "create" and op.id is not None:
+            detail = "id: not allowed for create"
+        elif op.id is not None and op.id in seen:
+            detail = f"Entry {op.id} already used in row {seen[op.id]}"
+        if detail:
+            report.results.append(schemas.EntryBatchResult(row=number, op=op.op, id=op.id, status="failed", detail=detail))
+            continue
+        if op.id is not None:
+            seen[op.id] = number
+        ops.append((number, op))
+    return ops
+
+def apply(db: Session, rows: Iterable[Tuple[int, dict]], user_id: int) -> schemas.EntryBatchReport:
+    report = schemas.EntryBatchReport()
+    ops = _parse(rows, report)
+    if not ops and not report.results: # empty list: nothing to do
+        report.applied = True
+        return report
+
+    entry = models.WorkEntry
+    deletes = [(number, op) for number, op in ops if op.op == "delete"]
+    updates = [(number, op) for number, op in ops if op.op == "update"]
+    creates = [(number, op) for number, op in ops if op.op == "create"]
+    now = datetime.utcnow()
+    try:
+        # First write: takes SQLite's write lock, so nothing read below can change
+        # before the commit (and it is rolled back if the batch is rejected)
+        versioning.bump(db, user_id)
+
+        # Current values of every entry touched, in one IN query. Only the user's own:
+        # other workers' and archived entries are "not found", as in PUT/DELETE
+        ids = [op.id for _, op in ops if op.id is not None]
+        existing = {}
+        if ids:
+            existing = {
+                row.id: row._asdict()
+                for row in db.execute(
+                    select(entry.id, entry.user_id, entry.date, entry.shift, entry.task, entry.amount, entry.created_at)
+                    .where(entry.id.in_(ids), entry.user_id == user_id)
+                )
+            }
+        for number, op in ops:
+            if op.id is not None and op.id not in existing:
+                report.results.append(schemas.EntryBatchResult(
+                    row=number, op=op.op, id=op.id, status="failed", detail="Entry not found"
+                ))
+
+        report.failed = len(report.results)
+        if report.failed:
+            db.rollback()
+            failed = {r.row for r in report.results}
+            report.results.extend(
+                schemas.EntryBatchResult(row=number, op=op.op, id=op.id, status="skipped", detail="Batch not applied")
+                for number, op in ops if number not in failed
+            )
+            report.results.sort(key=lambda r: r.row)
+            return report
+
+        if deletes:
+            db.execute(entry.__table__.delete().where(entry.id.in_([op.id for _, op in deletes])))
+        if updates:
+            db.execute(update(entry), [{"id": op.id, **op.entry.model_dump()} for _, op in updates])
+
+        created_ids = []
+        if creates:
+            # No RETURNING (with guaranteed order SQLite would do it row by row): with
+            # the write lock held, the new ids are the ones after the current maximum
+            last_id = db.scalar(select(func.max(entry.id))) or 0
+            params = [{**op.entry.model_dump(), "user_id": user_id, "created_at": now} for _, op in creates]
+            db.execute(insert(entry.__table__), params)
+            created_ids = db.scalars(select(entry.id).where(entry.id > last_id).order_by(entry.id)).all()
+
+        removed = [existing[op.id] for _, op in deletes + updates]
+        added = [{**op.entry.model_dump(), "user_id": user_id} for _, op in updates + creates]
+        rollups.apply_entries(db, added, removed)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for number, op in deletes:
+        report.results.append(schemas.EntryBatchResult(row=number, op=op.op, id=op.id, status="deleted"))
+    for number, op in updates:
+        current = {**existing[op.id], **op.entry.model_dump()}
+        report.results.append(schemas.EntryBatchResult(
+            row=number, op=op.op, id=op.id, status="updated", entry=schemas.WorkEntry(**current)
+        ))
+    for (number, op), new_id in zip(creates, created_ids):
+        report.results.append(schemas.EntryBatchResult(
+            row=number, op=op.op, id=new_id, status="created",
+            entry=schemas.WorkEntry(**op.entry.model_dump(), id=new_id, user_id=user_id, created_at=now),
+        ))
+    report.applied = True
+    report.created, report.updated, report.deleted = len(creates), len(updates), len(deletes)
+    report.results.sort(key=lambda r: r.row)
+    return report
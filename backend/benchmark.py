@@ -0,0 +1,562 @@
+"""In-process benchmark / load test of the API.
+
+Builds a synthetic database (N workers x Y years of entries), fires every endpoint
+of main.py concurrently against the ASGI app (httpx, no network) and measures per
+endpoint: p50/p95/p99, throughput, SQL queries per request and peak memory. Results
+are saved as JSON in benchmarks/ and compared against a baseline to flag
+regressions.
+
+    python benchmark.py run --workers 200 --years 3 --save baseline
+    python benchmark.py run --workers 200 --years 3 --compare baseline
+    python benchmark.py run --only entries.list,admin.summary
+    python benchmark.py compare baseline otra
+
+Reads are measured cold by default: every request carries a different `_b=<n>`
+parameter so the ETag never matches and the response cache does not serve it.
+With --warm the same URL is repeated and the cached path is measured. Needs httpx
+(pip install httpx), which production does not.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.getenv("BENCH_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+# Margin before counting a regression (p95, throughput, memory) and noise floor in ms
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.20"))
+BENCH_NOISE_MS = float(os.getenv("BENCH_NOISE_MS", "2.0"))
+
+BENCH_PASSWORD = "bench123"
+SHIFTS = ["Mañana", "Tarde", "Noche"]
+TASKS = ["Sacos", "Quemadores", "Filtros FO/Lodos", "Magnesio", "Derrames/Fugas"]
+
+
+# --- Data -----------------------------------------------------------------------
+
+def build_dataset(workers: int, years: int, seed: int = 42):
+    """Test DB from the synthetic generator; every user shares BENCH_PASSWORD."""
+    import database, migrations, synthetic_data
+
+    migrations.upgrade(database.engine)
+    db = database.SessionLocal()
+    try:
+        _, entries = synthetic_data.generate(db, workers, years, seed, password=BENCH_PASSWORD)
+        return entries
+    finally:
+        db.close()
+
+
+# --- Scenarios ------------------------------------------------------------------
+# Each scenario is (name, method, main.py route, function). The function takes
+# (client, ctx, n) and returns the response; `n` is unique per request.
+
+def _csv(header, rows):
+    out = io.StringIO()
+    out.write(",".join(header) + "\n")
+    for row in rows:
+        out.write(",".join(str(v) for v in row) + "\n")
+    return out.getvalue().encode("utf-8")
+
+def _nonce(ctx, n):
+    return {} if ctx["warm"] else {"_b": n}
+
+async def _root(c, ctx, n):
+    return await c.get("/")
+
+async def _login(c, ctx, n):
+    return await c.post("/token", data={"username": ctx["worker"], "password": BENCH_PASSWORD})
+
+async def _me(c, ctx, n):
+    return await c.get("/users/me", headers=ctx["user_headers"])
+
+async def _password(c, ctx, n):
+    body = {"old_password": BENCH_PASSWORD, "new_password": BENCH_PASSWORD}
+    return await c.put("/users/me/password", json=body, headers=ctx["pw_headers"])
+
+async def _create_user(c, ctx, n):
+    body = {"username": f"new{ctx['run']}_{n}", "full_name": "Bench", "password": BENCH_PASSWORD, "role": "user"}
+    return await c.post("/users/", json=body, headers=ctx["admin_headers"])
+
+async def _bulk_users(c, ctx, n):
+    body = [{"username": f"bulk{ctx['run']}_{n}_{i}", "full_name": "Bench", "password": BENCH_PASSWORD} for i in range(10)]
+    return await c.post("/users/bulk", json=body, headers=ctx["admin_headers"])
+
+async def _bulk_users_upload(c, ctx, n):
+    data = _csv(["username", "full_name", "password"],
+                [(f"up{ctx['run']}_{n}_{i}", "Bench", BENCH_PASSWORD) for i in range(10)])
+    files = {"file": ("usuarios.csv", data, "text/csv")}
+    return await c.post("/users/bulk/upload", files=files, headers=ctx["admin_headers"])
+
+def _entry_body(n):
+    today = date.today()
+    return {"date": (today - timedelta(days=n % 28)).isoformat(), "shift": SHIFTS[n % 3],
+            "task": TASKS[n % len(TASKS)], "amount": 1.5}
+
+async def _create_entry(c, ctx, n):
+    return await c.post("/entries/", json=_entry_body(n), headers=ctx["user_headers"])
+
+async def _bulk_entries(c, ctx, n):
+    body = [_entry_body(n * 10 + i) for i in range(10)]
+    return await c.post("/entries/bulk", json=body, headers=ctx["user_headers"])
+
+async def _batch_entries(c, ctx, n):
+    # Mixed: creates, one edit and deleting entries created by earlier batches
+    created = ctx["batch_created"]
+    ops = [{"op": "create", "entry": _entry_body(n * 10 + i)} for i in range(8)]
+    ops.append({"op": "update", "id": ctx["entry_ids"][n % len(ctx["entry_ids"])], "entry": {**_entry_body(n), "amount": 3.0}})
+    ops += [{"op": "delete", "id": created.pop()} for _ in range(min(2, len(created)))]
+    response = await c.post("/entries/batch", json=ops, headers=ctx["user_headers"])
+    if response.status_code == 200:
+        created.extend(r["id"] for r in response.json()["results"] if r["status"] == "created")
+    return response
+
+async def _list_entries(c, ctx, n):
+    return await c.get("/entries/", params={"limit": 100, **_nonce(ctx, n)}, headers=ctx["user_headers"])
+
+async def _list_entries_range(c, ctx, n):
+    today = date.today()
+    params = {"from": date(today.year, 1, 1).isoformat(), "to": today.isoformat(), "limit": 500, **_nonce(ctx, n)}
+    return await c.get("/entries/", params=params, headers=ctx["user_headers"])
+
+async def _update_entry(c, ctx, n):
+    entry_id = ctx["entry_ids"][n % len(ctx["entry_ids"])]
+    body = {**_entry_body(n), "amount": 2.0 + (n % 4) / 4}
+    return await c.put(f"/entries/{entry_id}", json=body, headers=ctx["user_headers"])
+
+async def _delete_entry(c, ctx, n):
+    return await c.delete(f"/entries/{ctx['doomed_entries'].pop()}", headers=ctx["user_headers"])
+
+async def _monthly_stats(c, ctx, n):
+    return await c.get("/entries/stats/monthly", params=_nonce(ctx, n), headers=ctx["user_headers"])
+
+async def _export_month(c, ctx, n):
+    today = date.today()
+    params = {"year": today.year, "month": today.month, "format": "csv"}
+    return await c.get("/export/month", params=params, headers=ctx["user_headers"])
+
+async def _export_month_job(c, ctx, n):
+    today = date.today()
+    params = {"year": today.year, "month": 1 + n % today.month, "format": "csv"}
+    response = await c.post("/export/month/jobs", params=params, headers=ctx["user_headers"])
+    if response.status_code == 202:
+        ctx["user_jobs"].append(response.json()["id"])
+    return response
+
+async def _export_job(c, ctx, n):
+    job_id = ctx["user_jobs"][n % len(ctx["user_jobs"])]
+    return await c.get(f"/export/jobs/{job_id}", headers=ctx["user_headers"])
+
+async def _export_job_download(c, ctx, n):
+    job_id = ctx["user_jobs"][n % len(ctx["user_jobs"])]
+    return await c.get(f"/export/jobs/{job_id}/download", headers=ctx["user_headers"])
+
+async def _set_rate(c, ctx, n):
+    body = {"year": date.today().year, "rate": 11.0 + (n % 3) / 10}
+    return await c.post("/admin/rates", json=body, headers=ctx["admin_headers"])
+
+async def _get_rates(c, ctx, n):
+    return await c.get("/admin/rates", params=_nonce(ctx, n), headers=ctx["admin_headers"])
+
+async def _import_entries(c, ctx, n):
+    today = date.today()
+    data = _csv(["username", "date", "shift", "task", "amount"],
+                [(ctx["worker"], (today - timedelta(days=i)).isoformat(), "Mañana", "Sacos", "1,5") for i in range(50)])
+    files = {"file": ("partes.csv", data, "text/csv")}
+    return await c.post("/admin/entries/import", files=files, data={"dry_run": "true"}, headers=ctx["admin_headers"])
+
+async def _admin_export(c, ctx, n):
+    today = date.today()
+    params = {"format": "csv", "date_from": date(today.year, today.month, 1).isoformat()}
+    return await c.get("/admin/export", params=params, headers=ctx["admin_headers"])
+
+async def _admin_export_job(c, ctx, n):
+    today = date.today()
+    body = {"format": "csv", "date_from": (date(today.year, 1, 1) + timedelta(days=n % 28)).isoformat()}
+    response = await c.post("/admin/exports", json=body, headers=ctx["admin_headers"])
+    if response.status_code == 202:
+        ctx["admin_jobs"].append(response.json()["id"])
+    return response
+
+async def _admin_job(c, ctx, n):
+    job_id = ctx["admin_jobs"][n % len(ctx["admin_jobs"])]
+    return await c.get(f"/admin/exports/{job_id}", headers=ctx["admin_headers"])
+
+async def _admin_job_download(c, ctx, n):
+    job_id = ctx["admin_jobs"][n % len(ctx["admin_jobs"])]
+    return await c.get(f"/admin/exports/{job_id}/download", headers=ctx["admin_headers"])
+
+async def _summary(c, ctx, n):
+    return await c.get("/admin/summary", params=_nonce(ctx, n), headers=ctx["admin_headers"])
+
+async def _payroll(c, ctx, n):
+    params = {"year": date.today().year, **_nonce(ctx, n)}
+    return await c.get("/admin/payroll", params=params, headers=ctx["admin_headers"])
+
+async def _analytics(c, ctx, n):
+    params = {"group_by": "worker,task", "period": "month", **_nonce(ctx, n)}
+    return await c.get("/admin/analytics", params=params, headers=ctx["admin_headers"])
+
+async def _list_users(c, ctx, n):
+    params = {"limit": 100, **_nonce(ctx, n)}
+    return await c.get("/admin/users", params=params, headers=ctx["admin_headers"])
+
+async def _delete_user(c, ctx, n):
+    return await c.delete(f"/admin/users/{ctx['doomed_users'].pop()}", headers=ctx["admin_headers"])
+
+async def _cache_stats(c, ctx, n):
+    return await c.get("/admin/cache/stats", headers=ctx["admin_headers"])
+
+async def _archive(c, ctx, n):
+    # The first call moves the closed years, the rest only re-sweep (last scenario on purpose)
+    return await c.post("/admin/archive", headers=ctx["admin_headers"])
+
+async def _list_backups(c, ctx, n):
+    return await c.get("/admin/backups", headers=ctx["admin_headers"])
+
+async def _create_backup(c, ctx, n):
+    response = await c.post("/admin/backups", headers=ctx["admin_headers"])
+    if response.status_code == 200:
+        ctx["backups"].append(response.json()["name"])
+    return response
+
+async def _verify_backup(c, ctx, n):
+    # Rotation only keeps the newest BACKUP_KEEP files
+    return await c.post(f"/admin/backups/{ctx['backups'][-1]}/verify", headers=ctx["admin_headers"])
+
+SCENARIOS = [
+    ("root", "GET", "/", _root),
+    ("auth.login", "POST", "/token", _login),
+    ("users.me", "GET", "/users/me", _me),
+    ("users.password", "PUT", "/users/me/password", _password),
+    ("users.create", "POST", "/users/", _create_user),
+    ("users.bulk", "POST", "/users/bulk", _bulk_users),
+    ("users.bulk_upload", "POST", "/users/bulk/upload", _bulk_users_upload),
+    ("entries.create", "POST", "/entries/", _create_entry),
+    ("entries.bulk", "POST", "/entries/bulk", _bulk_entries),
+    ("entries.batch", "POST", "/entries/batch", _batch_entries),
+    ("entries.list", "GET", "/entries/", _list_entries),
+    ("entries.list_range", "GET", "/entries/", _list_entries_range),
+    ("entries.update", "PUT", "/entries/{entry_id}", _update_entry),
+    ("entries.delete", "DELETE", "/entries/{entry_id}", _delete_entry),
+    ("entries.stats", "GET", "/entries/stats/monthly", _monthly_stats),
+    ("export.month", "GET", "/export/month", _export_month),
+    ("export.month_job", "POST", "/export/month/jobs", _export_month_job),
+    ("export.job", "GET", "/export/jobs/{job_id}", _export_job),
+    ("export.job_download", "GET", "/export/jobs/{job_id}/download", _export_job_download),
+    ("admin.rates_set", "POST", "/admin/rates", _set_rate),
+    ("admin.rates", "GET", "/admin/rates", _get_rates),
+    ("admin.import", "POST", "/admin/entries/import", _import_entries),
+    ("admin.export", "GET", "/admin/export", _admin_export),
+    ("admin.export_job", "POST", "/admin/exports", _admin_export_job),
+    ("admin.export_job_status", "GET", "/admin/exports/{job_id}", _admin_job),
+    ("admin.export_job_download", "GET", "/admin/exports/{job_id}/download", _admin_job_download),
+    ("admin.summary", "GET", "/admin/summary", _summary),
+    ("admin.payroll", "GET", "/admin/payroll", _payroll),
+    ("admin.analytics", "GET", "/admin/analytics", _analytics),
+    ("admin.users", "GET", "/admin/users", _list_users),
+    ("admin.users_delete", "DELETE", "/admin/users/{user_id}", _delete_user),
+    ("admin.cache_stats", "GET", "/admin/cache/stats", _cache_stats),
+    ("admin.backup_create", "POST", "/admin/backups", _create_backup),
+    ("admin.backups", "GET", "/admin/backups", _list_backups),
+    ("admin.backup_verify", "POST", "/admin/backups/{name}/verify", _verify_backup),
+    ("admin.archive", "POST", "/admin/archive", _archive),
+]
+
+def uncovered_routes(app):
+    """App routes without a scenario: flags newly added endpoints."""
+    covered = {(method, path) for _, method, path, _ in SCENARIOS}
+    missing = []
+    for route in app.routes:
+        for method in sorted(getattr(route, "methods", None) or []):
+            if method in ("HEAD", "OPTIONS") or route.path.startswith(("/docs", "/redoc", "/openapi")):
+                continue
+            if (method, route.path) not in covered:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+# --- Measurement ----------------------------------------------------------------
+
+class QueryCounter:
+    """Counts the statements that reach SQLite through any of the engines."""
+
+    def __init__(self):
+        self.count = 0
+
+    def attach(self):
+        from sqlalchemy import event
+        import database
+        for engine in (database.engine, database.read_engine,
+                       database.async_engine.sync_engine, database.async_read_engine.sync_engine):
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+async def _timed(fn, client, ctx, n):
+    start = time.perf_counter()
+    try:
+        response = await fn(client, ctx, n)
+        ok = response.status_code < 400
+    except Exception as e:
+        print(f"   error: {e}")
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+async def run_scenario(client, ctx, fn, requests, concurrency, counter, profile_requests):
+    # 1) Warm-up (lazy imports, SQLAlchemy caches) and sequential profile: queries
+    # per request and peak memory. tracemalloc slows things down, so it is kept
+    # apart from the latency measurement
+    await _timed(fn, client, ctx, ctx["next"]())
+    queries_before = counter.count
+    tracemalloc.start()
+    for _ in range(profile_requests):
+        await _timed(fn, client, ctx, ctx["next"]())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queries = (counter.count - queries_before) / max(profile_requests, 1)
+
+    # 2) Concurrent load
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await _timed(fn, client, ctx, ctx["next"]())
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(ms for ms, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "throughput_rps": round(requests / wall, 1) if wall else 0.0,
+        "queries_per_request": round(queries, 1),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+def _disposable_rows(worker, needed, run):
+    """Own entries and users for update/delete, independent of the dataset size."""
+    from sqlalchemy import insert, select
+    import database, models, rollups, versioning
+
+    today = date.today()
+    db = database.SessionLocal()
+    try:
+        worker_id = db.scalar(select(models.User.id).where(models.User.username == worker))
+        hashed = db.scalar(select(models.User.hashed_password).where(models.User.id == worker_id))
+        doomed_users = db.execute(
+            insert(models.User.__table__).returning(models.User.id, sort_by_parameter_order=True),
+            [{"username": f"doomed{run}_{i}", "full_name": "Bench", "hashed_password": hashed, "role": "user"}
+             for i in range(needed)],
+        ).scalars().all()
+        rows = [
+            {"user_id": user_id, "date": today - timedelta(days=i % 28), "shift": SHIFTS[i % 3],
+             "task": TASKS[i % len(TASKS)], "amount": 1.0}
+            for i, user_id in enumerate([worker_id] * needed * 2 + list(doomed_users))
+        ]
+        entry_ids = db.execute(
+            insert(models.WorkEntry.__table__).returning(models.WorkEntry.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        rollups.apply_entries(db, rows)
+        versioning.bump(db)
+        db.commit()
+        return list(entry_ids[:needed]), list(entry_ids[needed:needed * 2]), list(doomed_users)
+    finally:
+        db.close()
+
+async def _prepare(client, ctx, needed):
+    """Tokens, entries and users consumed by the update/delete scenarios."""
+
+    async def token(username, password):
+        response = await client.post("/token", data={"username": username, "password": password})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    ctx["admin_headers"] = await token(os.environ["ADMIN_USER"], os.environ["ADMIN_PASSWORD"])
+    ctx["user_headers"] = await token(ctx["worker"], BENCH_PASSWORD)
+    ctx["pw_headers"] = await token(ctx["pw_worker"], BENCH_PASSWORD)
+    ctx["entry_ids"], ctx["doomed_entries"], ctx["doomed_users"] = _disposable_rows(ctx["worker"], needed, ctx["run"])
+
+async def _wait_for_jobs(timeout=120):
+    """Downloads only make sense once the jobs have finished (409 otherwise)."""
+    import export_jobs
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with export_jobs._lock:
+            pending = [job for job in export_jobs._jobs.values() if job["status"] in ("queued", "running")]
+        if not pending:
+            return
+        await asyncio.sleep(0.05)
+
+async def run_all(args):
+    import httpx
+    import main
+
+    counter = QueryCounter()
+    counter.attach()
+    seq = iter(range(1, 10 ** 9))
+    ctx = {
+        "warm": args.warm,
+        "run": int(time.time()),
+        "worker": "w00000",
+        "pw_worker": "w00001",
+        "user_jobs": [],
+        "admin_jobs": [],
+        "backups": [],
+        "batch_created": [],
+        "next": lambda: next(seq),
+    }
+
+    missing = uncovered_routes(main.app)
+    if missing:
+        print(f"⚠️  Rutas sin escenario: {', '.join(missing)}")
+
+    results = {}
+    # lifespan_context runs main's on_event("startup") handlers (schema, rollups, admin user)
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            await _prepare(client, ctx, args.requests + args.profile_requests + 1)
+            for name, method, path, fn in SCENARIOS:
+                if args.only and name not in args.only:
+                    continue
+                if name in ("export.job_download", "admin.export_job_download"):
+                    await _wait_for_jobs()
+                results[name] = await run_scenario(
+                    client, ctx, fn, args.requests, args.concurrency, counter, args.profile_requests
+                )
+                r = results[name]
+                print(f"  {name:28} p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms"
+                      f"  {r['throughput_rps']:8.1f} req/s  {r['queries_per_request']:5.1f} q/req"
+                      f"  {r['peak_memory_kb']:9.1f} KB  err {r['errors']}")
+    return results
+
+
+# --- Baselines ------------------------------------------------------------------
+
+def _baseline_path(name):
+    return name if name.endswith(".json") else os.path.join(BENCH_DIR, f"{name}.json")
+
+def save(name, report):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = _baseline_path(name)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Guardado en {path}")
+
+def load(name):
+    with open(_baseline_path(name)) as f:
+        return json.load(f)
+
+def compare(baseline, current, tolerance=BENCH_TOLERANCE):
+    """Regressions of `current` against `baseline` (endpoints in both)."""
+    regressions = []
+    for name, new in current["endpoints"].items():
+        old = baseline["endpoints"].get(name)
+        if not old:
+            continue
+        # p99 over few requests is mostly noise: stored but not compared
+        for key in ("p50_ms", "p95_ms"):
+            if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] > BENCH_NOISE_MS:
+                regressions.append(f"{name}: {key} {old[key]} -> {new[key]}")
+        if new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_rps']} -> {new['throughput_rps']} req/s")
+        # Queries per request are deterministic: any increase is suspicious (N+1)
+        if new["queries_per_request"] > old["queries_per_request"] + 0.5:
+            regressions.append(f"{name}: queries/request {old['queries_per_request']} -> {new['queries_per_request']}")
+        if new["peak_memory_kb"] > old["peak_memory_kb"] * (1 + tolerance) and new["peak_memory_kb"] - old["peak_memory_kb"] > 256:
+            regressions.append(f"{name}: peak memory {old['peak_memory_kb']} -> {new['peak_memory_kb']} KB")
+        if new["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors {old['errors']} -> {new['errors']}")
+    if baseline.get("meta", {}).get("dataset") != current.get("meta", {}).get("dataset"):
+        print("⚠️  La baseline se midió con otro dataset; la comparación es orientativa")
+    return regressions
+
+def report_regressions(regressions):
+    if not regressions:
+        print("✅ Sin regresiones frente a la baseline")
+        return 0
+    print(f"❌ {len(regressions)} regresión(es):")
+    for line in regressions:
+        print(f"   {line}")
+    return 1
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="construye el dataset y mide todos los endpoints")
+    run.add_argument("--workers", type=int, default=100)
+    run.add_argument("--years", type=int, default=2)
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--requests", type=int, default=50, help="peticiones por endpoint")
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--profile-requests", type=int, default=3)
+    run.add_argument("--warm", action="store_true", help="repite la misma URL (mide el response cache)")
+    run.add_argument("--only", type=lambda s: set(s.split(",")), default=None)
+    run.add_argument("--save", metavar="NAME")
+    run.add_argument("--compare", metavar="NAME")
+
+    cmp_parser = sub.add_parser("compare", help="compara dos resultados guardados")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return report_regressions(compare(load(args.baseline), load(args.current)))
+
+    # Temporary DB and config before importing anything from the app (database reads DATA_DIR on import)
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="horas-bench-")
+    os.environ.setdefault("ADMIN_USER", "admin")
+    os.environ.setdefault("ADMIN_PASSWORD", "admin123")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    start = time.perf_counter()
+    rows = build_dataset(args.workers, args.years, args.seed)
+    print(f"Dataset: {args.workers} trabajadores x {args.years} años = {rows} partes "
+          f"({time.perf_counter() - start:.1f}s) en {os.environ['DATA_DIR']}")
+
+    endpoints = asyncio.run(run_all(args))
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "dataset": {"workers": args.workers, "years": args.years, "seed": args.seed, "entries": rows},
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warm": args.warm,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "endpoints": endpoints,
+    }
+    if args.save:
+        save(args.save, report)
+    if args.compare:
+        return report_regressions(compare(load(args.compare), report))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,5 +1,11 @@
 import os
 import sys
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
 
 # Add current dir to sys.path to ensure imports work if run directly
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -7,10 +13,161 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from database import SessionLocal, DB_PATH
 import models
 
+# Live diagnostics (enabled through the environment, main.py calls install()):
+#   SLOW_QUERY_MS=50            logs queries slower than this (SQL, parameters and route)
+#   SLOW_QUERY_LOG=/path.log    to a file instead of stdout
+#   DEBUG_N_PLUS_ONE=5          warns when a request repeats the same query 5+ times (development only)
+#   DEBUG_QUERY_CATALOG=q.jsonl saves every distinct query shape, for "python debug_utils.py explain"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+DEBUG_N_PLUS_ONE = int(os.getenv("DEBUG_N_PLUS_ONE", "0"))
+DEBUG_QUERY_CATALOG = os.getenv("DEBUG_QUERY_CATALOG")
+
+_request: ContextVar = ContextVar("debug_request", default=None)
+_log_lock = threading.Lock()
+_catalog_seen = set()
+
+class RequestQueries:
+    __slots__ = ("route", "shapes")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.shapes = Counter()
+
+def query_shape(statement: str) -> str:
+    """Normalized SQL: whitespace collapsed and IN (?, ?, ...) lists of any length made equal."""
+    return re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", " ".join(statement.split()))
+
+def _short(value, limit=300) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _write_log(line: str):
+    if not SLOW_QUERY_LOG:
+        print(line)
+        return
+    with _log_lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+def _jsonable(params):
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        params = params[0] # executemany: the first row is enough for the plan
+    if isinstance(params, dict):
+        params = list(params.values())
+    return [p if isinstance(p, (int, float, str, type(None))) else str(p) for p in params or ()]
+
+def _record_catalog(shape: str, statement: str, parameters):
+    if shape in _catalog_seen or not shape.upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH", "INSERT")):
+        return
+    with _log_lock:
+        if shape in _catalog_seen:
+            return
+        _catalog_seen.add(shape)
+        current = _request.get()
+        with open(DEBUG_QUERY_CATALOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "route": current.route if current else "",
+                "sql": statement,
+                "params": _jsonable(parameters),
+            }, ensure_ascii=False) + "\n")
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("debug_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("debug_start")
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000 if starts else 0.0
+    current = _request.get()
+    shape = query_shape(statement)
+
+    if current is not None:
+        current.shapes[shape] += 1
+    if SLOW_QUERY_MS and elapsed_ms >= SLOW_QUERY_MS:
+        route = current.route if current else "-"
+        _write_log(f"[slow-sql] {elapsed_ms:.1f}ms route={route} sql={' '.join(statement.split())} params={_short(parameters)}")
+    if DEBUG_QUERY_CATALOG:
+        _record_catalog(shape, statement, parameters)
+
+class DebugMiddleware:
+    """Tags the request's queries with its route and, when it ends, warns about N+1s."""
+
+    def __init__(self, app, router_app=None):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        import metrics
+        route = metrics._route_template(self.router_app, scope) if self.router_app else scope["path"]
+        current = RequestQueries(f"{scope['method']} {route}")
+        token = _request.set(current)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request.reset(token)
+            if DEBUG_N_PLUS_ONE:
+                for shape, count in current.shapes.most_common():
+                    if count < DEBUG_N_PLUS_ONE:
+                        break
+                    _write_log(f"[n+1] {current.route}: {count}x {_short(shape, 200)}")
+
+def install(app, *engines):
+    """Hooks up the diagnostics enabled in the environment. Does nothing if there are none."""
+    if not (SLOW_QUERY_MS or DEBUG_N_PLUS_ONE or DEBUG_QUERY_CATALOG):
+        return
+    from sqlalchemy import event
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(DebugMiddleware, router_app=app)
+    print(f"🔎 Diagnósticos SQL: slow={SLOW_QUERY_MS or 'off'}ms n+1={DEBUG_N_PLUS_ONE or 'off'} "
+          f"catalog={DEBUG_QUERY_CATALOG or 'off'}")
+
+def explain_report(catalog_path: str = None) -> int:
+    """EXPLAIN QUERY PLAN for the hot queries in migrations.py and every query in the
+    captured catalog; lists the full scans. Returns how many queries do one."""
+    import migrations
+    from database import engine
+
+    migrations.upgrade(engine)
+    tables = set(models.Base.metadata.tables)
+    queries = []
+    with engine.connect() as conn:
+        for name, stmt in migrations.hot_queries().items():
+            compiled = stmt.compile(dialect=conn.dialect)
+            params = compiled.construct_params()
+            queries.append((name, str(compiled), [params[key] for key in compiled.positiontup or ()]))
+        if catalog_path:
+            with open(catalog_path, encoding="utf-8") as f:
+                for line in f:
+                    item = json.loads(line)
+                    queries.append((item["route"] or "(background)", item["sql"], item["params"]))
+
+        flagged = 0
+        for name, sql, params in queries:
+            try:
+                plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", tuple(params)).all()]
+            except Exception as e:
+                print(f"⚠️  {name}: no se pudo analizar ({e})")
+                continue
+            scans = [d for d in plan if (m := migrations.FULL_SCAN.match(d)) and m.group(1) in tables]
+            if not scans:
+                continue
+            # Without a WHERE reading everything is what was asked for (e.g. all rates)
+            if " WHERE " not in f" {' '.join(sql.split()).upper()} ":
+                print(f"ℹ️  {name}: {', '.join(scans)} (sin filtro, lectura completa)")
+                continue
+            flagged += 1
+            print(f"❌ {name}: {', '.join(scans)}")
+            print(f"   {' '.join(sql.split())[:300]}")
+    print(f"{len(queries)} consultas analizadas, {flagged} con full scan")
+    return flagged
+
 def print_status():
     print(f"\n--- DIAGNOSTICO BBDD: {DB_PATH} ---")
     print(f"ENV ADMIN_USER: {os.getenv('ADMIN_USER', 'No definido')}")
-    
+
     if not os.path.exists(DB_PATH):
         print("❌ EL ARCHIVO DE BBDD NO EXISTE.")
         return
@@ -29,9 +186,13 @@ def print_status():
 def nuke_db():
     print(f"\n⚠️  ATENCION: BORRANDO BASE DE DATOS EN: {DB_PATH}")
     try:
-        if os.path.exists(DB_PATH):
-            os.remove(DB_PATH)
-            print("✅ Archivo .db borrado correctamente.")
+        existed = os.path.exists(DB_PATH)
+        # In WAL mode a leftover -wal/-shm would be applied to the new DB
+        for path in (DB_PATH, DB_PATH + "-wal", DB_PATH + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        if existed:
+            print("✅ Archivo .db (y sus -wal/-shm) borrado correctamente.")
             print("♻️  REINICIA EL CONTENEDOR AHORA PARA REGENERARLA.")
         else:
             print("ℹ️  El archivo no existía.")
@@ -41,6 +202,10 @@ def nuke_db():
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "nuke":
         nuke_db()
+    elif len(sys.argv) > 1 and sys.argv[1] == "explain":
+        # Optional catalog: DEBUG_QUERY_CATALOG=q.jsonl during normal use or a benchmark
+        sys.exit(1 if explain_report(sys.argv[2] if len(sys.argv) > 2 else DEBUG_QUERY_CATALOG) else 0)
     else:
         print_status()
         print("Para borrar la BBDD usa: python debug_utils.py nuke")
+        print("Planes de consulta (full scans): python debug_utils.py explain [catalogo.jsonl]")
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+import schemas, database, exports, versioning
+
+# Local background export queue. Finished files are kept in DATA_DIR/exports under a
+# name derived from the filters and the version of the data they cover, so a repeated
+# request over unchanged data is served right away. Each job's state is also written
+# to EXPORTS_DIR/jobs/<id>.json: with several workers, polling or downloading may hit
+# another process.
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_JOB_TTL = int(os.getenv("EXPORT_JOB_TTL", "3600"))  # seconds finished jobs stay listed
+# Cap for the whole artifact directory: files unused for longer than the TTL go, then
+# the least recently used ones until it fits in EXPORT_CACHE_MAX_MB
+EXPORT_ARTIFACT_TTL = int(os.getenv("EXPORT_ARTIFACT_TTL", str(7 * 24 * 3600)))
+EXPORT_CACHE_MAX_MB = int(os.getenv("EXPORT_CACHE_MAX_MB", "512"))
+EXPORTS_DIR = os.path.join(database.DATA_DIR, "exports")
+JOBS_DIR = os.path.join(EXPORTS_DIR, "jobs")
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+_jobs = {}
+_lock = threading.Lock()
+
+def _filters_hash(filters: schemas.ExportFilters, fmt: str, layout: str) -> str:
+    payload = json.dumps(
+        {"filters": filters.model_dump(mode="json"), "format": fmt, "layout": layout},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _data_version(filters: schemas.ExportFilters) -> str:
+    # A single-worker export only depends on that worker's data; any other export only
+    # on the months in its date range, so writes to the current month leave exports of
+    # closed periods valid
+    db = database.ReadSessionLocal()
+    try:
+        if filters.user_id is not None:
+            scope = versioning.user_scope(filters.user_id)
+            return f"user{filters.user_id}-{versioning.get(db, scope)}"
+        return f"months-{versioning.months_version(db, filters.date_from, filters.date_to)}"
+    finally:
+        db.close()
+
+def _count_rows(filters: schemas.ExportFilters, layout: str) -> int:
+    db = database.ReadSessionLocal()
+    try:
+        query = exports.build_query(filters, layout).order_by(None).subquery()
+        return db.execute(select(func.count()).select_from(query)).scalar() or 0
+    finally:
+        db.close()
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _save(job: dict):
+    # Atomic write: another worker never reads a half-written JSON
+    tmp_path = _job_path(job["id"]) + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, _job_path(job["id"]))
+    except OSError as e:
+        print(f"Error saving export job {job['id']}: {e}")
+
+def _load(job_id: str):
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _prune_jobs():
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job["finished_at"] and now - job["finished_at"] > EXPORT_JOB_TTL:
+            del _jobs[job_id]
+    # Jobs from any worker: by age of their state file
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > EXPORT_JOB_TTL:
+                os.remove(path)
+        except OSError:
+            pass
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _prune_artifacts(prefix: str, keep: str):
+    # Older data versions of the same export are never served again. Then the whole
+    # directory: stale files go (including .part files left by a crash), and the least
+    # recently used artifacts until it fits in the size cap. Recent .part files belong
+    # to jobs still running, possibly in another worker
+    now = time.time()
+    artifacts = []
+    total = 0
+    for name in os.listdir(EXPORTS_DIR):
+        path = os.path.join(EXPORTS_DIR, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        partial = name.endswith(".part")
+        if name != keep and (now - stat.st_mtime > EXPORT_ARTIFACT_TTL or (name.startswith(prefix + "-") and not partial)):
+            _remove(path)
+            continue
+        total += stat.st_size
+        if name != keep and not partial:
+            artifacts.append((stat.st_mtime, stat.st_size, path))
+
+    for _, size, path in sorted(artifacts):
+        if total <= EXPORT_CACHE_MAX_MB * 1024 * 1024:
+            break
+        _remove(path)
+        total -= size
+
+def _new_job(owner_id: int, fmt: str, filename: str, path: str) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "owner_id": owner_id,
+        "status": "queued",
+        "format": fmt,
+        "filename": filename,
+        "path": path,
+        "rows": 0,
+        "total_rows": None,
+        "cached": False,
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+
+def _run(job: dict, filters: schemas.ExportFilters, fmt: str, layout: str, prefix: str):
+    job["status"] = "running"
+    # Per-job temp file: another worker may be building the same artifact
+    tmp_path = f"{job['path']}.{job['id']}.part"
+    try:
+        job["total_rows"] = _count_rows(filters, layout)
+        _save(job)
+        saved_at = time.time()
+
+        def progress(rows):
+            nonlocal saved_at
+            job["rows"] = rows
+            if time.time() - saved_at >= 1:
+                _save(job)
+                saved_at = time.time()
+
+        with open(tmp_path, "wb") as f:
+            if fmt == "csv":
+                for chunk in exports.stream_csv(filters, layout):
+                    f.write(chunk)
+                job["rows"] = job["total_rows"]
+            else:
+                exports.write_xlsx(filters, f, layout, progress=progress)
+        os.replace(tmp_path, job["path"])
+        _prune_artifacts(prefix, os.path.basename(job["path"]))
+        job["status"] = "done"
+    except Exception as e:
+        print(f"Error building export {job['id']}: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        job["finished_at"] = time.time()
+        _save(job)
+
+def submit(filters: schemas.ExportFilters, fmt: str, layout: str, owner_id: int, filename: str) -> dict:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    prefix = _filters_hash(filters, fmt, layout)
+    path = os.path.join(EXPORTS_DIR, f"{prefix}-{_data_version(filters)}.{fmt}")
+
+    with _lock:
+        _prune_jobs()
+        job = _new_job(owner_id, fmt, filename, path)
+
+        if os.path.exists(path):
+            # Same filters, same data version: serve the cached artifact right away
+            try:
+                os.utime(path) # recently used: last to go when the directory is trimmed
+            except OSError:
+                pass
+            job.update(status="done", cached=True, finished_at=time.time())
+            _jobs[job["id"]] = job
+            _save(job)
+            return job
+
+        # An identical export is already being built: share it. Admin exports are
+        # visible to every admin and user exports carry the user in their filters
+        for other in _jobs.values():
+            if other["path"] == path and other["status"] in ("queued", "running"):
+                return other
+
+        _jobs[job["id"]] = job
+        _save(job)
+    _executor.submit(_run, job, filters, fmt, layout, prefix)
+    return job
+
+def get(job_id: str):
+    # This process's jobs are up to date in memory; the others, in their file
+    return _jobs.get(job_id) or _load(job_id)
+
+def to_schema(job: dict) -> schemas.ExportJob:
+    total = job["total_rows"]
+    if job["status"] == "done":
+        progress = 1.0
+    elif total:
+        progress = min(job["rows"] / total, 1.0)
+    else:
+        progress = 0.0
+    return schemas.ExportJob(
+        id=job["id"],
+        status=job["status"],
+        format=job["format"],
+        rows=job["rows"],
+        total_rows=total,
+        progress=progress,
+        cached=job["cached"],
+        error=job["error"],
+    )
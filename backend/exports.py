@@ -0,0 +1,113 @@
+import csv
+import io
+import os
+import tempfile
+from typing import Iterator
+from sqlalchemy import select
+import models, schemas, database, archive
+
+# Streaming export engine: rows are read in batches (yield_per) and written as they
+# arrive, never collected into lists or DataFrames.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+CHUNK_SIZE = 64 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+
+# Column layouts: admin export (all workers) and per-user monthly summary
+ADMIN_COLUMNS = ["Worker", "Username", "Date", "Shift", "Task", "Hours (Decimal)", "Format (HH:MM)"]
+USER_COLUMNS = ["Fecha", "Turno", "Tarea", "Horas", "Horas (HH:MM)"]
+
+def format_hhmm(amount: float) -> str:
+    return f"{int(amount):02d}:{int(round((amount - int(amount)) * 60)):02d}"
+
+def build_query(filters: schemas.ExportFilters, layout: str = "admin"):
+    entry = archive.entries(filters.date_from).c
+    if layout == "admin":
+        stmt = select(
+            models.User.full_name, models.User.username,
+            entry.date, entry.shift, entry.task, entry.amount,
+        ).join(models.User, entry.user_id == models.User.id)
+    else:
+        stmt = select(entry.date, entry.shift, entry.task, entry.amount)
+
+    if filters.date_from:
+        stmt = stmt.where(entry.date >= filters.date_from)
+    if filters.date_to:
+        stmt = stmt.where(entry.date <= filters.date_to)
+    if filters.user_id is not None:
+        stmt = stmt.where(entry.user_id == filters.user_id)
+    if filters.task:
+        stmt = stmt.where(entry.task == filters.task)
+
+    # Admin export keeps table (rowid) order so SQLite never has to sort the whole table
+    # (only ranges reaching archived years need a sort, to merge both tables)
+    if layout == "admin":
+        return stmt.order_by(entry.id)
+    return stmt.order_by(entry.date, entry.id)
+
+def iter_batches(filters: schemas.ExportFilters, layout: str = "admin", batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list]:
+    # Own session: the generator outlives the request dependency that created it
+    db = database.ReadSessionLocal()
+    try:
+        result = db.execute(build_query(filters, layout).execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            batch = []
+            for row in partition:
+                amount = row.amount or 0
+                batch.append((*row, format_hhmm(amount)))
+            yield batch
+    finally:
+        db.close()
+
+def stream_csv(filters: schemas.ExportFilters, layout: str = "admin") -> Iterator[bytes]:
+    columns = ADMIN_COLUMNS if layout == "admin" else USER_COLUMNS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the accents correctly
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    for batch in iter_batches(filters, layout):
+        writer.writerows(batch)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def write_xlsx(filters: schemas.ExportFilters, fileobj, layout: str = "admin", progress=None):
+    from openpyxl import Workbook
+
+    columns = ADMIN_COLUMNS if layout == "admin" else USER_COLUMNS
+    # write_only: openpyxl flushes rows to disk instead of keeping them in memory
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(columns)
+    rows = 0
+    for batch in iter_batches(filters, layout):
+        for row in batch:
+            ws.append(row)
+        rows += len(batch)
+        if progress:
+            progress(rows)
+    wb.save(fileobj)
+    return rows
+
+def stream_xlsx(filters: schemas.ExportFilters, layout: str = "admin") -> Iterator[bytes]:
+    # XLSX is a zip, so it can only be sent once finished: build it on disk, then stream it
+    with tempfile.TemporaryFile() as tmp:
+        write_xlsx(filters, tmp, layout)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def stream(filters: schemas.ExportFilters, fmt: str = "xlsx", layout: str = "admin"):
+    """Returns (bytes generator, media type) for the requested format."""
+    if fmt == "csv":
+        return stream_csv(filters, layout), CSV_MEDIA_TYPE
+    return stream_xlsx(filters, layout), XLSX_MEDIA_TYPE
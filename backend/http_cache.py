@@ -0,0 +1,94 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import serialization, versioning
+
+# ETags derived from the data version counters. A read endpoint computes its ETag
+# with a primary key lookup; if the client already has that version it answers 304
+# without running the main queries. Behind it sits an LRU response cache keyed the
+# same way.
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_MAX_ITEM = int(os.getenv("RESPONSE_CACHE_MAX_ITEM", str(1024 * 1024))) # bytes
+
+# Browsers keep the body but always revalidate with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+class ResponseCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: str, body: bytes, headers: dict):
+        if self.max_size <= 0 or len(body) > RESPONSE_CACHE_MAX_ITEM:
+            return
+        with self._lock:
+            self._entries[key] = (body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+def make_etag(request: Request, versions: dict, principal_id: Optional[int] = None, extra: str = "") -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    stamp = ",".join(f"{scope}={versions[scope]}" for scope in sorted(versions))
+    raw = f"{request.url.path}?{query}|{principal_id}|{stamp}|{extra}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Only a validator this server handed out counts: "*" on a GET would answer 304
+    # to a client that never received the resource
+    candidates = [c.strip() for c in header.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
+
+def _headers(etag: str, extra: dict = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if extra:
+        headers.update(extra)
+    return headers
+
+async def check(request: Request, db: AsyncSession, scopes, principal_id: Optional[int] = None, extra: str = ""):
+    """Returns (etag, response). If response is not None, the endpoint returns it as is."""
+    versions = await db.run_sync(versioning.get_many, scopes)
+    etag = make_etag(request, versions, principal_id, extra)
+    if _matches(request, etag):
+        return etag, Response(status_code=304, headers=_headers(etag))
+    cached = response_cache.get(etag)
+    if cached is not None:
+        body, headers = cached
+        return etag, Response(body, media_type="application/json", headers=_headers(etag, headers))
+    return etag, None
+
+def respond(etag: str, content, headers: dict = None) -> Response:
+    body = serialization.dumps(content)
+    response_cache.put(etag, body, headers or {})
+    return Response(body, media_type="application/json", headers=_headers(etag, headers))
@@ -0,0 +1,177 @@
+import os
+import re
+from datetime import date, datetime, time as dtime
+from typing import Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import models, schemas, rollups, versioning, uploads
+
+# Bulk import of hour entries: every row is validated, workers are resolved with a
+# single query and rows are inserted in batches (executemany) inside one
+# transaction. If any row fails nothing is written.
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+
+COLUMN_ALIASES = {
+    "usuario": "username",
+    "fecha": "date",
+    "dia": "date",
+    "turno": "shift",
+    "jornada": "shift",
+    "tarea": "task",
+    "horas": "amount",
+    "horas penosas": "amount",
+    "hours": "amount",
+}
+
+SPANISH_MONTHS = {
+    "ENERO": 1, "FEBRERO": 2, "MARZO": 3, "ABRIL": 4, "MAYO": 5, "JUNIO": 6, "JULIO": 7,
+    "AGOSTO": 8, "SEPTIEMBRE": 9, "SETIEMBRE": 9, "OCTUBRE": 10, "NOVIEMBRE": 11, "DICIEMBRE": 12,
+}
+MONTH_HEADER = re.compile(r"^([A-ZÁÉÍÓÚ]+)\s+(\d{4})$")
+
+def _parse_amount(value):
+    # Excel may store hours as a number, as "HH:MM" text or as a time of day
+    if isinstance(value, dtime):
+        return value.hour + value.minute / 60
+    if isinstance(value, str) and ":" in value:
+        hours, minutes = value.split(":", 1)
+        return int(hours) + int(minutes) / 60
+    if isinstance(value, str):
+        return float(value.replace(",", "."))
+    return value
+
+def _normalize(raw: dict) -> dict:
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        name = " ".join(str(key).lower().split())
+        name = COLUMN_ALIASES.get(name, name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        if isinstance(value, datetime):
+            value = value.date()
+        row[name] = value
+    if "amount" in row:
+        row["amount"] = _parse_amount(row["amount"])
+    return row
+
+def _read_legacy_sheet(ws) -> Iterator[Tuple[int, dict]]:
+    # Old "HORAS PENOSAS PENDIENTE DE PAGO" sheet: blocks of 4 columns
+    # (Dia, Jornada, Tarea, Horas) under a "MARZO 2024" header, ending in a "Total" row
+    full_name = None
+    periods = {}
+    for number, values in enumerate(ws.iter_rows(values_only=True), start=1):
+        if number == 1:
+            full_name = values[1] if len(values) > 1 else None
+            continue
+        for col in range(0, len(values), 4):
+            cell = values[col]
+            if isinstance(cell, str):
+                match = MONTH_HEADER.match(cell.strip().upper())
+                if match and match.group(1) in SPANISH_MONTHS:
+                    periods[col] = (int(match.group(2)), SPANISH_MONTHS[match.group(1)])
+                elif cell.strip().lower() == "total":
+                    periods.pop(col, None)
+                continue
+            if cell is None or col not in periods:
+                continue
+            year, month = periods[col]
+            shift, task, amount = (list(values[col + 1:col + 4]) + [None] * 3)[:3]
+            row = {"full_name": full_name, "shift": shift, "task": task, "amount": amount}
+            try:
+                row["date"] = date(year, month, int(cell))
+            except (TypeError, ValueError):
+                row["date"] = cell
+            yield number, row
+
+def _legacy_sheet(header, ws):
+    if isinstance(header[0], str) and header[0].strip().lower() == "nombre:":
+        return _read_legacy_sheet(ws)
+    return None
+
+def read_upload(filename: str, fileobj) -> List[Tuple[int, dict]]:
+    """[(row number, dict)] from a CSV, a plain XLSX or the old sheet (raises uploads.UploadError)."""
+    return uploads.read_upload(filename, fileobj, special_sheet=_legacy_sheet)
+
+def _resolve_users(db: Session, rows: List[dict]):
+    # One lookup for every worker referenced in the file
+    usernames = {r["username"] for r in rows if "username" in r}
+    full_names = {r["full_name"] for r in rows if "full_name" in r and "username" not in r}
+    by_username, by_full_name = {}, {}
+    if usernames:
+        for user_id, username in db.query(models.User.id, models.User.username).filter(models.User.username.in_(usernames)):
+            by_username[username] = user_id
+    if full_names:
+        # Names are not unique: keep every match so a shared name is reported, not guessed
+        for user_id, full_name in db.query(models.User.id, models.User.full_name).filter(models.User.full_name.in_(full_names)):
+            by_full_name.setdefault(full_name, []).append(user_id)
+    return by_username, by_full_name
+
+def ingest(
+    db: Session,
+    rows: Iterable[Tuple[int, dict]],
+    user_id: Optional[int] = None,
+    dry_run: bool = False,
+) -> schemas.EntryImportReport:
+    """user_id sets the worker for every row; otherwise username / full_name is used."""
+    report = schemas.EntryImportReport(dry_run=dry_run)
+    parsed = []
+    for number, raw in rows:
+        report.total_rows += 1
+        try:
+            parsed.append((number, _normalize(raw)))
+        except (TypeError, ValueError) as e:
+            report.errors.append(schemas.RowError(row=number, detail=f"amount: {e}"))
+
+    by_username, by_full_name = ({}, {}) if user_id is not None else _resolve_users(db, [r for _, r in parsed])
+
+    params = []
+    for number, row in parsed:
+        try:
+            entry = schemas.WorkEntryCreate(**row)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(p) for p in error["loc"])
+            report.errors.append(schemas.RowError(row=number, detail=f"{field}: {error['msg']}"))
+            continue
+
+        owner_id = user_id
+        if owner_id is None:
+            if "username" in row:
+                owner_id = by_username.get(str(row["username"]))
+            elif "full_name" in row:
+                matches = by_full_name.get(row["full_name"], [])
+                if len(matches) > 1:
+                    report.errors.append(schemas.RowError(
+                        row=number, detail=f"Ambiguous worker: {len(matches)} users are named {row['full_name']}, use username"
+                    ))
+                    continue
+                owner_id = matches[0] if matches else None
+            if owner_id is None:
+                worker = row.get("username") or row.get("full_name")
+                report.errors.append(schemas.RowError(row=number, detail=f"Unknown worker: {worker}"))
+                continue
+        params.append({**entry.model_dump(), "user_id": owner_id, "created_at": datetime.utcnow()})
+
+    report.valid = len(params)
+    report.errors.sort(key=lambda e: e.row)
+    if dry_run or report.errors or not params:
+        return report
+
+    try:
+        for start in range(0, len(params), INGEST_BATCH_SIZE):
+            db.execute(insert(models.WorkEntry.__table__), params[start:start + INGEST_BATCH_SIZE])
+        rollups.apply_entries(db, params)
+        for owner_id in {p["user_id"] for p in params}:
+            versioning.bump(db, owner_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    report.imported = len(params)
+    return report
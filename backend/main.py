@@ -1,15 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import time
+_BOOT = time.perf_counter() # startup timing report (see startup())
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, UploadFile, File, Form, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-import models, schemas, auth, database
-import pandas as pd
-from io import BytesIO
-from fastapi.responses import StreamingResponse
-
-models.Base.metadata.create_all(bind=database.engine)
+import asyncio
+import os
+from datetime import date
+import models, schemas, auth, database, rollups, exports, export_jobs, versioning, migrations, provisioning, ingestion, http_cache, payroll, analytics, metrics, debug_utils, serialization, archive, backup, batch, uploads
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 
+# Heavy libraries (pandas, openpyxl) are imported inside payroll/exports/ingestion on
+# first use, and the schema is applied in startup() or by "python migrations.py
+# upgrade" - importing this module touches no database
 app = FastAPI()
 
 # CORS configuration
@@ -25,33 +34,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Optional response compression by size (GZIP_MIN_SIZE bytes, 0 = off)
+if serialization.GZIP_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=serialization.GZIP_MIN_SIZE)
+
+# Latency / in-flight per route, SQL count and time per request (/metrics, Server-Timing).
+# Added last so it wraps CORS too
+metrics.instrument(database.engine, database.read_engine,
+                   database.async_engine.sync_engine, database.async_read_engine.sync_engine)
+app.add_middleware(metrics.MetricsMiddleware, router_app=app)
+# Slow-query log, N+1 detector and query catalog; off unless enabled by env (see debug_utils.py)
+debug_utils.install(app, database.engine, database.read_engine,
+                    database.async_engine.sync_engine, database.async_read_engine.sync_engine)
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {
         "message": "Bienvenido a la API de Horas Penosas",
         "docs": "/docs",
         "status": "running"
     }
 
-# Dependency
-def get_db():
+# Dependencies: every route uses the async session stack (database.get_async_db /
+# get_async_read_db). Heavy sync pipelines (bcrypt process pool, file parsing) run
+# in a worker thread with their own sync session instead of blocking the loop.
+def _run_with_session(fn, *args, **kwargs):
     db = database.SessionLocal()
     try:
-        yield db
+        return fn(db, *args, **kwargs)
     finally:
         db.close()
 
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    result = await db.execute(select(models.User).where(models.User.username == form_data.username))
+    user = result.scalars().first()
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if auth.needs_rehash(user.hashed_password):
+        # Old cost factor: upgrade the hash now that we have the plain password
+        try:
+            user.hashed_password = await auth.get_password_hash_async(form_data.password)
+            await db.commit()
+        except HTTPException:
+            pass # hashing pool saturated, try again on a later login
     access_token_expires = auth.timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -59,17 +92,17 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(
+async def create_user(
     user: schemas.UserCreate, 
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to create users")
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
+    result = await db.execute(select(models.User.id).where(models.User.username == user.username))
+    if result.first():
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.get_password_hash_async(user.password)
     db_user = models.User(
         username=user.username, 
         full_name=user.full_name, 
@@ -77,360 +110,590 @@ def create_user(
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.run_sync(versioning.bump)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-@app.post("/users/bulk", response_model=List[schemas.User])
-def create_users_bulk(
-    users: List[schemas.UserCreate],
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+@app.post("/users/bulk", response_model=schemas.BulkUserReport)
+async def create_users_bulk(
+    users: List[dict],
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to create users")
-    
-    created_users = []
-    errors = []
-    
-    for user_data in users:
-        db_user = db.query(models.User).filter(models.User.username == user_data.username).first()
-        if db_user:
-            errors.append(f"User {user_data.username} already exists")
-            continue
-            
-        hashed_password = auth.get_password_hash(user_data.password)
-        new_user = models.User(
-            username=user_data.username,
-            full_name=user_data.full_name,
-            hashed_password=hashed_password,
-            role=user_data.role
-        )
-        db.add(new_user)
-        created_users.append(new_user)
-    
-    if errors and not created_users:
-        raise HTTPException(status_code=400, detail="; ".join(errors))
-        
-    db.commit()
-    for u in created_users:
-        db.refresh(u)
-        
-    return created_users
+    # Rows are validated one by one inside the report, so a bad row doesn't reject the rest
+    return await run_in_threadpool(_run_with_session, provisioning.provision, enumerate(users, start=1))
+
+@app.post("/users/bulk/upload", response_model=schemas.BulkUserReport)
+async def create_users_bulk_upload(
+    file: UploadFile = File(...),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to create users")
+    # CSV/XLSX with columns username, full_name, password, role (Spanish headers accepted)
+    try:
+        rows = await run_in_threadpool(uploads.read_upload, file.filename or "", file.file)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(_run_with_session, provisioning.provision, rows)
 
 @app.get("/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(auth.get_current_active_user)):
+async def read_users_me(current_user: auth.Principal = Depends(auth.get_current_active_user)):
     return current_user
 
 @app.put("/users/me/password")
-def update_password(
+async def update_password(
     password_data: schemas.UserPasswordUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    if not auth.verify_password(password_data.old_password, current_user.hashed_password):
+    # The cached principal carries no password hash: check against the stored one
+    user_in_db = await db.get(models.User, current_user.id)
+    if not await auth.verify_password_async(password_data.old_password, user_in_db.hashed_password):
          raise HTTPException(status_code=400, detail="Incorrect old password")
     
-    # Re-fetch user in current session to ensure persistence
-    user_in_db = db.query(models.User).filter(models.User.id == current_user.id).first()
-    user_in_db.hashed_password = auth.get_password_hash(password_data.new_password)
+    user_in_db.hashed_password = await auth.get_password_hash_async(password_data.new_password)
     
     db.add(user_in_db) # Explicitly add to session
-    db.commit()
-    db.refresh(user_in_db)
+    await db.run_sync(versioning.bump_principals)
+    await db.commit()
+    await db.refresh(user_in_db)
+    auth.principal_cache.invalidate(user_in_db.username)
     
     return {"message": "Password updated successfully"}
 
 @app.post("/entries/", response_model=schemas.WorkEntry)
-def create_work_entry(
+async def create_work_entry(
     entry: schemas.WorkEntryCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     db_entry = models.WorkEntry(**entry.model_dump(), user_id=current_user.id)
     db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    await db.run_sync(rollups.add_entry, db_entry)
+    await db.run_sync(versioning.bump, current_user.id)
+    await db.commit()
+    await db.refresh(db_entry)
     return db_entry
 
+@app.post("/entries/bulk", response_model=schemas.EntryImportReport)
+async def create_work_entries_bulk(
+    entries: List[dict],
+    dry_run: bool = False,
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    # All rows are validated first; nothing is written unless every row is valid
+    return await run_in_threadpool(
+        _run_with_session, ingestion.ingest, enumerate(entries, start=1), user_id=current_user.id, dry_run=dry_run
+    )
+
+@app.post("/entries/batch", response_model=schemas.EntryBatchReport)
+async def apply_entry_batch(
+    operations: List[dict],
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    # [{"op": "create"|"update"|"delete", "id": ..., "entry": {...}}, ...] on the user's own
+    # entries. All or nothing: any failed row leaves the rest as "skipped"
+    if len(operations) > batch.ENTRY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {batch.ENTRY_BATCH_MAX} operations per batch")
+    return await run_in_threadpool(
+        _run_with_session, batch.apply, enumerate(operations, start=1), user_id=current_user.id
+    )
+
+def _encode_entry_cursor(entry_date: date, entry_id: int) -> str:
+    import base64
+    return base64.urlsafe_b64encode(f"{entry_date.isoformat()}|{entry_id}".encode()).decode()
+
+def _decode_entry_cursor(cursor: str):
+    import base64
+    try:
+        entry_date, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(entry_date), int(entry_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/entries/", response_model=List[schemas.WorkEntry])
-def read_work_entries(
+async def read_work_entries(
+    request: Request,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
     month: Optional[int] = None,
     year: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    query = db.query(models.WorkEntry).filter(models.WorkEntry.user_id == current_user.id)
-    
+    from sqlalchemy import tuple_
+
+    etag, cached = await http_cache.check(request, db, [versioning.user_scope(current_user.id)], current_user.id)
+    if cached:
+        return cached
+
     if month and year:
         # Filter for specific month
         # Calculate start and end date of the month
         import calendar
-        from datetime import date
         _, last_day = calendar.monthrange(year, month)
-        start_date = date(year, month, 1)
-        end_date = date(year, month, last_day)
-        query = query.filter(models.WorkEntry.date >= start_date, models.WorkEntry.date <= end_date)
+        date_from = date(year, month, 1)
+        date_to = date(year, month, last_day)
+
+    # Plain column tuples in schemas.WorkEntry field order: no ORM instances, no
+    # per-row Pydantic validation (the response_model stays for the API docs).
+    # Ranges reaching archived years read work_entries UNION ALL the archive
+    entry = archive.entries(date_from).c
+    query = select(
+        entry.date, entry.shift, entry.task, entry.amount, entry.id, entry.user_id, entry.created_at
+    ).where(entry.user_id == current_user.id)
+    if date_from:
+        query = query.where(entry.date >= date_from)
+    if date_to:
+        query = query.where(entry.date <= date_to)
+
+    # Keyset pagination on (date, id): same cost for every page, no skipped or
+    # repeated rows when several entries share a date. The (user_id, date) index
+    # already carries the rowid, so SQLite walks it without sorting (with the
+    # archive, it merges both indexes).
+    if cursor:
+        query = query.where(tuple_(entry.date, entry.id) < _decode_entry_cursor(cursor))
+    elif skip:
+        query = query.offset(skip) # legacy offset paging
     
-    entries = query.order_by(models.WorkEntry.date.desc()).offset(skip).limit(limit).all()
-    return entries
+    result = await db.execute(query.order_by(entry.date.desc(), entry.id.desc()).limit(limit))
+    rows = result.all()
+    headers = {}
+    if len(rows) == limit:
+        headers["X-Next-Cursor"] = _encode_entry_cursor(rows[-1].date, rows[-1].id)
+    return http_cache.respond(etag, [row._asdict() for row in rows], headers)
 
 @app.put("/entries/{entry_id}", response_model=schemas.WorkEntry)
-def update_work_entry(
+async def update_work_entry(
     entry_id: int,
     entry_update: schemas.WorkEntryUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     try:
-        entry = db.query(models.WorkEntry).filter(
+        result = await db.execute(select(models.WorkEntry).where(
             models.WorkEntry.id == entry_id, 
             models.WorkEntry.user_id == current_user.id
-        ).first()
+        ))
+        entry = result.scalars().first()
         
         if not entry:
             raise HTTPException(status_code=404, detail="Entry not found")
         
-        # Update all fields
+        # Update all fields (the rollup moves the old values out and the new ones in)
+        await db.run_sync(rollups.remove_entry, entry)
         entry.date = entry_update.date
         entry.shift = entry_update.shift
         entry.task = entry_update.task
         entry.amount = entry_update.amount
+        await db.run_sync(rollups.add_entry, entry)
+        await db.run_sync(versioning.bump, current_user.id)
         
-        db.commit()
-        db.refresh(entry)
+        await db.commit()
+        await db.refresh(entry)
         return entry
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error updating entry: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error updating entry: {str(e)}")
 
 
 @app.delete("/entries/{entry_id}")
-def delete_work_entry(
+async def delete_work_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    entry = db.query(models.WorkEntry).filter(models.WorkEntry.id == entry_id, models.WorkEntry.user_id == current_user.id).first()
+    result = await db.execute(select(models.WorkEntry).where(models.WorkEntry.id == entry_id, models.WorkEntry.user_id == current_user.id))
+    entry = result.scalars().first()
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
-    db.delete(entry)
-    db.commit()
+    await db.run_sync(rollups.remove_entry, entry)
+    await db.run_sync(versioning.bump, current_user.id)
+    await db.delete(entry)
+    await db.commit()
     return {"ok": True}
 
 
 @app.get("/entries/stats/monthly")
-def get_monthly_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+async def get_monthly_stats(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_read_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    from datetime import date, timedelta
-    from sqlalchemy import func, extract
-    import calendar
+    from datetime import date
 
     today = date.today()
-    stats = []
+    # Euros depend on the rates too; the 6-month window moves with the date
+    etag, cached = await http_cache.check(
+        request, db, [versioning.user_scope(current_user.id), versioning.RATES], current_user.id, extra=today.isoformat()
+    )
+    if cached:
+        return cached
+    spanish_months = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
 
-    # Get stats for last 6 months (including current)
+    # Last 6 months (including current), oldest first. Handles year wrap around
+    periods = []
     for i in range(5, -1, -1):
-        # Calculate month and year
-        # Logic to handle year wrap around
         month_target = today.month - i
         year_target = today.year
-        
         while month_target <= 0:
             month_target += 12
             year_target -= 1
-        
-        month_name = calendar.month_name[month_target][:3] # Jan, Feb... (English system locale default, usually fine or we map manually)
-        # Using spanish mapping for better UX
-        spanish_months = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
-        month_label = spanish_months[month_target]
-
-        total_hours = db.query(func.sum(models.WorkEntry.amount)).filter(
-            models.WorkEntry.user_id == current_user.id,
-            extract('month', models.WorkEntry.date) == month_target,
-            extract('year', models.WorkEntry.date) == year_target
-        ).scalar() or 0
-        
-        rate = db.query(models.AnnualRate.rate).filter(models.AnnualRate.year == year_target).scalar()
-        if not rate:
-            rate = 0
-            
-        total_euros = total_hours * rate
-        
+        periods.append((year_target, month_target))
+
+    # One indexed range query on the rollup + one query for the rates involved
+    hours_by_period = {
+        (r.year, r.month): r.hours or 0
+        for r in await db.run_sync(rollups.get_range, current_user.id, periods[0], periods[-1])
+    }
+    years = {year for year, _ in periods}
+    result = await db.execute(select(models.AnnualRate.year, models.AnnualRate.rate).where(models.AnnualRate.year.in_(years)))
+    rates = dict(result.all())
+
+    stats = []
+    for year_target, month_target in periods:
+        total_hours = hours_by_period.get((year_target, month_target), 0)
+        rate = rates.get(year_target) or 0
         stats.append({
-            "name": month_label,
+            "name": spanish_months[month_target],
             "hours": total_hours,
-            "euros": total_euros,
+            "euros": total_hours * rate,
             "year": year_target
         })
     
-    return stats
+    return http_cache.respond(etag, stats)
 
 @app.get("/export/month")
-def export_user_month(
+async def export_user_month(
     year: int,
     month: int,
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     import calendar
-    from datetime import date
     
     _, last_day = calendar.monthrange(year, month)
-    start_date = date(year, month, 1)
-    end_date = date(year, month, last_day)
-
-    entries = db.query(models.WorkEntry).filter(
-        models.WorkEntry.user_id == current_user.id,
-        models.WorkEntry.date >= start_date, 
-        models.WorkEntry.date <= end_date
-    ).all()
-    
-    data = []
-    for entry in entries:
-        data.append({
-            "Fecha": entry.date,
-            "Turno": entry.shift,
-            "Tarea": entry.task,
-            "Horas": entry.amount,
-            "Horas (HH:MM)": f"{int(entry.amount):02d}:{int(round((entry.amount - int(entry.amount)) * 60)):02d}"
-        })
-    
-    df = pd.DataFrame(data)
-    stream = BytesIO()
-    with pd.ExcelWriter(stream) as writer:
-        df.to_excel(writer, index=False)
-    
-    stream.seek(0)
+    filters = schemas.ExportFilters(
+        date_from=date(year, month, 1),
+        date_to=date(year, month, last_day),
+        user_id=current_user.id,
+    )
+    content, media_type = exports.stream(filters, fmt, layout="user")
+
     month_name = calendar.month_name[month]
-    filename = f"resumen_{current_user.username}_{month_name}_{year}.xlsx"
+    filename = f"resumen_{current_user.username}_{month_name}_{year}.{fmt}"
     
     headers = {
         'Content-Disposition': f'attachment; filename="{filename}"'
     }
-    return StreamingResponse(stream, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return StreamingResponse(content, headers=headers, media_type=media_type)
+
+@app.post("/export/month/jobs", response_model=schemas.ExportJob, status_code=202)
+async def create_user_month_export_job(
+    year: int,
+    month: int,
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    import calendar
+
+    _, last_day = calendar.monthrange(year, month)
+    filters = schemas.ExportFilters(
+        date_from=date(year, month, 1),
+        date_to=date(year, month, last_day),
+        user_id=current_user.id,
+    )
+    filename = f"resumen_{current_user.username}_{calendar.month_name[month]}_{year}.{fmt}"
+    job = await run_in_threadpool(export_jobs.submit, filters, fmt, "user", current_user.id, filename)
+    return export_jobs.to_schema(job)
+
+def _get_export_job(job_id: str, current_user: auth.Principal):
+    job = export_jobs.get(job_id)
+    if not job or (job["owner_id"] != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+def _download_export_job(job: dict):
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+    if not os.path.exists(job["path"]):
+        # Replaced by a newer version of the same export
+        raise HTTPException(status_code=410, detail="Export expired, request it again")
+    media_type = exports.CSV_MEDIA_TYPE if job["format"] == "csv" else exports.XLSX_MEDIA_TYPE
+    return FileResponse(job["path"], media_type=media_type, filename=job["filename"])
+
+@app.get("/export/jobs/{job_id}", response_model=schemas.ExportJob)
+async def get_export_job(job_id: str, current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    return export_jobs.to_schema(_get_export_job(job_id, current_user))
+
+@app.get("/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str, current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    return _download_export_job(_get_export_job(job_id, current_user))
 
 @app.post("/admin/rates", response_model=schemas.AnnualRate)
-def create_or_update_rate(
+async def create_or_update_rate(
     rate_data: schemas.AnnualRate,
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    existing = db.query(models.AnnualRate).filter(models.AnnualRate.year == rate_data.year).first()
+    existing = await db.get(models.AnnualRate, rate_data.year)
     if existing:
         existing.rate = rate_data.rate
     else:
         existing = models.AnnualRate(year=rate_data.year, rate=rate_data.rate)
         db.add(existing)
+    await db.run_sync(versioning.bump, rates=True)
     
-    db.commit()
-    db.refresh(existing)
+    await db.commit()
+    await db.refresh(existing)
     return existing
 
+@app.post("/admin/entries/import", response_model=schemas.EntryImportReport)
+async def import_work_entries(
+    file: UploadFile = File(...),
+    dry_run: bool = Form(False),
+    username: Optional[str] = Form(None),
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    # CSV/XLSX with username, date, shift, task, amount columns (Spanish headers accepted),
+    # or the old "horas penosas pendientes" sheet. `username` assigns every row to one worker
+    user_id = None
+    if username:
+        user_id = await db.scalar(select(models.User.id).where(models.User.username == username))
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    try:
+        rows = await run_in_threadpool(ingestion.read_upload, file.filename or "", file.file)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(_run_with_session, ingestion.ingest, rows, user_id=user_id, dry_run=dry_run)
+
 @app.get("/admin/rates", response_model=List[schemas.AnnualRate])
-def get_rates(
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+async def get_rates(
+    request: Request,
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    return db.query(models.AnnualRate).order_by(models.AnnualRate.year.desc()).all()
+    # Same answer for every admin: shared cache entry
+    etag, cached = await http_cache.check(request, db, [versioning.RATES])
+    if cached:
+        return cached
+    rates = await db.execute(select(models.AnnualRate.year, models.AnnualRate.rate).order_by(models.AnnualRate.year.desc()))
+    return http_cache.respond(etag, [row._asdict() for row in rates])
 
 # --- ADMIN ENDPOINTS ---
 
 @app.get("/admin/export")
-def export_data(
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+async def export_data(
+    fmt: str = Query("xlsx", alias="format", pattern="^(xlsx|csv)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_id: Optional[int] = None,
+    task: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Query all data joined with users
-    results = db.query(models.WorkEntry, models.User).join(models.User).all()
-    
-    data = []
-    for entry, user in results:
-        data.append({
-            "Worker": user.full_name,
-            "Username": user.username,
-            "Date": entry.date,
-            "Shift": entry.shift,
-            "Task": entry.task,
-            "Hours (Decimal)": entry.amount,
-            "Format (HH:MM)": f"{int(entry.amount):02d}:{int(round((entry.amount - int(entry.amount)) * 60)):02d}"
-        })
-    
-    df = pd.DataFrame(data)
-    stream = BytesIO()
-    with pd.ExcelWriter(stream) as writer:
-        df.to_excel(writer, index=False)
-    
-    stream.seek(0)
+    # Rows are read in batches and streamed as they are written, never held all at once
+    filters = schemas.ExportFilters(date_from=date_from, date_to=date_to, user_id=user_id, task=task)
+    content, media_type = exports.stream(filters, fmt)
     
     headers = {
-        'Content-Disposition': 'attachment; filename="horas_penosas_export.xlsx"'
+        'Content-Disposition': f'attachment; filename="horas_penosas_export.{fmt}"'
     }
-    return StreamingResponse(stream, headers=headers, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return StreamingResponse(content, headers=headers, media_type=media_type)
+
+@app.post("/admin/exports", response_model=schemas.ExportJob, status_code=202)
+async def create_export_job(
+    request: schemas.ExportRequest,
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    filters = schemas.ExportFilters(**request.model_dump(exclude={"format"}))
+    filename = f"horas_penosas_export.{request.format}"
+    job = await run_in_threadpool(export_jobs.submit, filters, request.format, "admin", current_user.id, filename)
+    return export_jobs.to_schema(job)
+
+@app.get("/admin/exports/{job_id}", response_model=schemas.ExportJob)
+async def get_admin_export_job(job_id: str, current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return export_jobs.to_schema(_get_export_job(job_id, current_user))
+
+@app.get("/admin/exports/{job_id}/download")
+async def download_admin_export_job(job_id: str, current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return _download_export_job(_get_export_job(job_id, current_user))
 
 @app.get("/admin/summary")
-def get_summary(
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+async def get_summary(
+    request: Request,
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
+    etag, cached = await http_cache.check(request, db, [versioning.GLOBAL])
+    if cached:
+        return cached
+
     # Simple summary stats
-    total_users = db.query(models.User).count()
-    total_entries = db.query(models.WorkEntry).count()
+    total_users = await db.scalar(select(func.count()).select_from(models.User))
+    total_entries = await db.run_sync(archive.count)
     
-    # Recent 5 entries
-    recent_entries = db.query(models.WorkEntry, models.User).join(models.User).order_by(models.WorkEntry.created_at.desc()).limit(5).all()
+    # Recent 5 entries. Rows created today may already be archived (imports of closed
+    # years), so both tables are read, each through its created_at index
+    latest = archive.latest(5)
+    recent_entries = (await db.execute(
+        select(latest.c.date, latest.c.task, models.User.full_name)
+        .join(models.User, latest.c.user_id == models.User.id)
+        .order_by(latest.c.created_at.desc())
+    )).all()
     recent = []
-    for entry, user in recent_entries:
+    for entry in recent_entries:
          recent.append({
-            "worker": user.full_name,
+            "worker": entry.full_name,
             "date": entry.date,
             "task": entry.task
         })
 
-    return {
+    return http_cache.respond(etag, {
         "total_users": total_users,
         "total_entries": total_entries,
         "recent_activity": recent
-    }
+    })
 
-@app.get("/admin/users", response_model=List[schemas.User])
-def list_users(
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+@app.get("/admin/payroll", response_model=schemas.Payroll)
+async def get_payroll(
+    request: Request,
+    year: int,
+    to_year: Optional[int] = None,
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    to_year = to_year or year
+    if to_year < year or to_year - year > 10:
+        raise HTTPException(status_code=400, detail="Invalid year range")
+
+    etag, cached = await http_cache.check(request, db, [versioning.GLOBAL, versioning.RATES])
+    if cached:
+        return cached
+    return http_cache.respond(etag, await db.run_sync(payroll.compute, year, to_year))
+
+@app.get("/admin/analytics")
+async def get_analytics(
+    request: Request,
+    group_by: Optional[str] = Query(None, description="Comma separated: worker, task, shift"),
+    period: Optional[str] = Query(None, pattern="^(day|week|month|year)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    user_id: Optional[int] = None,
+    task: Optional[str] = None,
+    shift: Optional[str] = None,
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_read_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    return db.query(models.User).all()
+    dims = analytics.parse_group_by(group_by)
+
+    # Cached per data version: repeated pivots are answered from memory (or 304)
+    etag, cached = await http_cache.check(request, db, [versioning.GLOBAL])
+    if cached:
+        return cached
+    result = await db.run_sync(analytics.cube, dims, period, date_from, date_to, user_id, task, shift)
+    return http_cache.respond(etag, result)
+
+@app.get("/admin/users", response_model=List[schemas.UserSummary])
+async def list_users(
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_read_db)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    from sqlalchemy import case, and_
+
+    # Keyset pagination on id: pass the X-Next-Cursor header back as ?after=
+    page = select(models.User.id, models.User.username, models.User.full_name, models.User.role)
+    if after is not None:
+        page = page.where(models.User.id > after)
+    page = page.order_by(models.User.id).limit(limit).subquery()
+
+    # Totals for the whole page in one query: monthly rollup + last entry per user
+    today = date.today()
+    rollup = models.MonthlyRollup
+    is_this_year = rollup.year == today.year
+    is_this_month = and_(is_this_year, rollup.month == today.month)
+    last_activity = select(func.max(models.WorkEntry.created_at)).where(
+        models.WorkEntry.user_id == page.c.id
+    ).scalar_subquery()
+    if archive.hot_from() is not None:
+        archived = select(func.max(models.WorkEntryArchive.created_at)).where(
+            models.WorkEntryArchive.user_id == page.c.id
+        ).scalar_subquery()
+        # Scalar max(a, b) is NULL if either is: coalesce both ways
+        last_activity = func.max(func.coalesce(last_activity, archived), func.coalesce(archived, last_activity))
+    rows = (await db.execute(
+        select(
+            page.c.id, page.c.username, page.c.full_name, page.c.role,
+            func.coalesce(func.sum(rollup.entries), 0).label("entry_count"),
+            func.coalesce(func.sum(case((is_this_month, rollup.hours), else_=0)), 0).label("hours_month"),
+            func.coalesce(func.sum(case((is_this_year, rollup.hours), else_=0)), 0).label("hours_year"),
+            last_activity.label("last_activity"),
+        )
+        .select_from(page)
+        .outerjoin(rollup, rollup.user_id == page.c.id)
+        .group_by(page.c.id, page.c.username, page.c.full_name, page.c.role)
+        .order_by(page.c.id)
+    )).all()
+
+    headers = {"X-Next-Cursor": str(rows[-1].id)} if len(rows) == limit else None
+    # Trusted rows straight from SQL: same fields/types as schemas.UserSummary, no re-validation
+    content = [
+        {
+            "username": row.username, "full_name": row.full_name, "id": row.id, "role": row.role,
+            "entry_count": int(row.entry_count), "hours_month": float(row.hours_month),
+            "hours_year": float(row.hours_year), "last_activity": row.last_activity,
+        }
+        for row in rows
+    ]
+    return serialization.FastJSONResponse(content, headers=headers)
 
 @app.delete("/admin/users/{user_id}")
-def delete_user(
+async def delete_user(
     user_id: int,
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: auth.Principal = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    user_to_delete = db.query(models.User).filter(models.User.id == user_id).first()
+    user_to_delete = await db.get(models.User, user_id)
     if not user_to_delete:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -441,42 +704,145 @@ def delete_user(
     # but let's be safe and check if models have cascade or do it manually if needed.
     # Looking at models.py (I'll check later, but usually standard).
     
-    db.delete(user_to_delete)
-    db.commit()
+    await db.run_sync(rollups.delete_user, user_to_delete.id)
+    await db.run_sync(archive.delete_user, user_to_delete.id)
+    await db.run_sync(versioning.bump, user_to_delete.id)
+    await db.run_sync(versioning.bump_principals)
+    await db.delete(user_to_delete)
+    await db.commit()
+    auth.principal_cache.invalidate(user_to_delete.username)
     return {"message": "User deleted successfully"}
 
-# Seed Admin User (Quick & Dirty for initial setup)
-import os
+@app.get("/admin/cache/stats")
+async def get_cache_stats(current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {
+        "principals": auth.principal_cache.stats(),
+        "responses": http_cache.response_cache.stats(),
+    }
+
+@app.post("/admin/archive")
+async def archive_closed_years(
+    before_year: Optional[int] = None,
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    # Moves entries of closed years to work_entries_archive (also: python archive.py run)
+    try:
+        return await run_in_threadpool(_run_with_session, archive.run, before_year)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# ... (imports remain)
+@app.get("/admin/backups")
+async def list_backups(current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return await run_in_threadpool(backup.list_backups)
 
-# ... inside create_admin function:
-@app.on_event("startup")
-def create_admin():
-    db = database.SessionLocal()
-    # Check if ANY admin exists, not just one with username "admin"
-    # But for simplicity, let's stick to checking if our configured admin exists or if role=admin exists
-    # If we want to enforce the env var admin, we might need to check for that specific username.
-    
+@app.post("/admin/backups")
+async def create_backup(current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    # Online copy: readers and writers keep working. Restore is CLI only, with the app stopped (python backup.py restore)
+    try:
+        return await run_in_threadpool(backup.create)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/backups/{name}/verify")
+async def verify_backup(name: str, current_user: auth.Principal = Depends(auth.get_current_active_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    try:
+        return await run_in_threadpool(backup.verify, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    # Prometheus scrape endpoint. Open by default (internal network); set METRICS_TOKEN to require it
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+_IMPORTED = time.perf_counter()
+
+# Seed Admin User (Quick & Dirty for initial setup)
+async def _ensure_admin():
+    """Creates the admin if it doesn't exist. If it does, the password check (bcrypt)
+    runs in the background so it doesn't delay startup."""
     admin_user = os.getenv("ADMIN_USER", "admin")
     admin_password = os.getenv("ADMIN_PASSWORD", "admin123")
-    
-    # Check if user with this username exists
-    existing_user = db.query(models.User).filter(models.User.username == admin_user).first()
-    
-    if not existing_user:
-        print(f"Creating default admin user: {admin_user}")
-        hashed_pw = auth.get_password_hash(admin_password)
-        user = models.User(username=admin_user, full_name="System Admin", hashed_password=hashed_pw, role="admin")
-        db.add(user)
-        db.commit()
-    else:
-        # Force update password to match environment variable
-        # This ensures that if we change the env var in Coolify, the DB updates on restart
+
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User).where(models.User.username == admin_user))
+        existing_user = result.scalars().first()
+
+        if not existing_user:
+            print(f"Creating default admin user: {admin_user}")
+            hashed_pw = await auth.get_password_hash_async(admin_password)
+            user = models.User(username=admin_user, full_name="System Admin", hashed_password=hashed_pw, role="admin")
+            db.add(user)
+            await db.run_sync(versioning.bump)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Several workers starting at once on an empty DB: another one created it first
+                await db.rollback()
+                return None
+            auth.principal_cache.invalidate(admin_user)
+            return None
+
+        if existing_user.role != "admin":
+            # Ensure role is admin
+            existing_user.role = "admin"
+            await db.run_sync(versioning.bump_principals)
+            await db.commit()
+            auth.principal_cache.invalidate(admin_user)
+        stored_hash = existing_user.hashed_password
+
+    return asyncio.create_task(_sync_admin_password(admin_user, admin_password, stored_hash))
+
+async def _sync_admin_password(admin_user: str, admin_password: str, stored_hash: str):
+    # The env var wins (changing ADMIN_PASSWORD in Coolify resets it on restart), but only
+    # re-hash and write when it no longer matches or the bcrypt cost changed
+    try:
+        if await auth.verify_password_async(admin_password, stored_hash) and not auth.needs_rehash(stored_hash):
+            return
         print(f"Updating admin user password for: {admin_user}")
-        existing_user.hashed_password = auth.get_password_hash(admin_password)
-        # Ensure role is admin
-        existing_user.role = "admin"
-        db.commit()
-        
-    db.close()
+        hashed_pw = await auth.get_password_hash_async(admin_password)
+        async with database.AsyncSessionLocal() as db:
+            user = (await db.execute(select(models.User).where(models.User.username == admin_user))).scalars().first()
+            user.hashed_password = hashed_pw
+            await db.run_sync(versioning.bump_principals)
+            await db.commit()
+        auth.principal_cache.invalidate(admin_user)
+    except Exception as e:
+        print(f"Error updating admin password: {e}")
+
+@app.on_event("startup")
+async def startup():
+    timings = {"imports": _IMPORTED - _BOOT}
+
+    step = time.perf_counter()
+    if migrations.AUTO_MIGRATE:
+        await run_in_threadpool(migrations.upgrade, database.engine)
+    else:
+        # Schema applied beforehand by "python migrations.py upgrade" (see Dockerfile)
+        version = await run_in_threadpool(migrations.applied_version, database.engine)
+        if version < migrations.LATEST:
+            print(f"⚠️  Schema at version {version}, latest is {migrations.LATEST}: run python migrations.py upgrade")
+    timings["schema"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    app.state.admin_password_sync = await _ensure_admin()
+    timings["admin"] = time.perf_counter() - step
+
+    timings["total"] = time.perf_counter() - _BOOT
+    metrics.registry.startup = timings
+    print("⏱️  Startup: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()))
+
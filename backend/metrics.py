@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Per-request metrics with no external dependencies. An ASGI middleware measures
+# latency per route (template, not URL) and in-flight requests; engine events count
+# queries and SQL time for the current request (ContextVar). Everything is exposed
+# on /metrics in Prometheus format and in the Server-Timing header, so an N+1 or a
+# slow route shows up in the response itself.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # if set, /metrics requires "Bearer <token>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class RequestStats:
+    __slots__ = ("method", "route", "queries", "sql_seconds")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def current() -> Optional[RequestStats]:
+    """Stats of the current request (None outside a request)."""
+    return _current.get()
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}      # (method, route, status) -> count
+        self.latency = {}       # (method, route) -> Histogram
+        self.query_counts = {}  # (method, route) -> Histogram
+        self.in_flight = {}     # (method, route) -> gauge
+        self.sql = {}           # (method, route) -> [queries, seconds]; ("", "") = outside requests (jobs, startup)
+        self.startup = {}       # phase -> seconds (main.startup)
+
+    def start(self, method: str, route: str):
+        with self._lock:
+            key = (method, route)
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finish(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            key = (method, route)
+            self.in_flight[key] -= 1
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.query_counts.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+
+    def record_query(self, key: tuple, seconds: float):
+        with self._lock:
+            totals = self.sql.setdefault(key, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def render(self) -> str:
+        lines = []
+
+        def labels(**kw):
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + "}"
+
+        def histogram(name, help_text, data):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), h in sorted(data.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(method=method, route=route, le=_format(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{labels(method=method, route=route, le='+Inf')} {h.total}")
+                lines.append(f"{name}_sum{labels(method=method, route=route)} {_format(h.sum)}")
+                lines.append(f"{name}_count{labels(method=method, route=route)} {h.total}")
+
+        with self._lock:
+            if self.startup:
+                lines.append("# HELP app_startup_seconds Time spent in each startup phase")
+                lines.append("# TYPE app_startup_seconds gauge")
+                for phase, seconds in self.startup.items():
+                    lines.append(f"app_startup_seconds{labels(phase=phase)} {_format(seconds)}")
+
+            lines.append("# HELP http_requests_total Requests handled, by route template and status")
+            lines.append("# TYPE http_requests_total counter")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(method=method, route=route, status=status)} {count}")
+
+            lines.append("# HELP http_requests_in_flight Requests currently being handled")
+            lines.append("# TYPE http_requests_in_flight gauge")
+            for (method, route), count in sorted(self.in_flight.items()):
+                lines.append(f"http_requests_in_flight{labels(method=method, route=route)} {count}")
+
+            histogram("http_request_duration_seconds", "Request latency", self.latency)
+            histogram("http_request_db_queries", "SQL statements executed per request", self.query_counts)
+
+            lines.append("# HELP db_queries_total SQL statements executed, by route (empty route = background)")
+            lines.append("# TYPE db_queries_total counter")
+            for (method, route), (count, _) in sorted(self.sql.items()):
+                lines.append(f"db_queries_total{labels(method=method, route=route)} {count}")
+            lines.append("# HELP db_query_seconds_total Time spent executing SQL, by route")
+            lines.append("# TYPE db_query_seconds_total counter")
+            for (method, route), (_, seconds) in sorted(self.sql.items()):
+                lines.append(f"db_query_seconds_total{labels(method=method, route=route)} {_format(seconds)}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format(value: float) -> str:
+    return repr(float(value))
+
+registry = Registry()
+
+# --- SQL --------------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+    registry.record_query((stats.method, stats.route) if stats else ("", ""), elapsed)
+
+def instrument(*engines):
+    """Hooks up the SQL counters. For async engines, pass engine.sync_engine."""
+    if not METRICS_ENABLED:
+        return
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# --- HTTP -------------------------------------------------------------------------
+
+def _route_template(app, scope) -> str:
+    # Route template ("/entries/{entry_id}") so the label cardinality stays bounded
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware, which adds a task per request)."""
+
+    def __init__(self, app, router_app=None):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = _route_template(self.router_app, scope) if self.router_app else scope["path"]
+        stats = RequestStats(method, route)
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+        registry.start(method, route)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                timing = (
+                    f'app;dur={elapsed_ms:.1f}, '
+                    f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"'
+                )
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.finish(method, route, status, time.perf_counter() - start, stats)
+            _current.reset(token)
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+from datetime import date
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import models, schemas, exports, analytics, archive, rollups
+
+# Versioned schema migrations. The applied version is kept in PRAGMA user_version;
+# every migration must be idempotent (checkfirst / IF NOT EXISTS) because older
+# databases were created by create_all without a version.
+
+def _baseline(conn):
+    models.Base.metadata.create_all(bind=conn)
+
+def _work_entries_indexes(conn):
+    for index in models.WorkEntry.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _archive_table(conn):
+    models.WorkEntryArchive.__table__.create(bind=conn, checkfirst=True)
+    for index in models.WorkEntryArchive.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _work_entries_autoincrement(conn):
+    # SQLite can't ALTER a table into AUTOINCREMENT: it is rebuilt and the rows are
+    # copied with their ids. Then the sequence is moved above the archived ids and
+    # ids already repeated between both tables are renumbered
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'work_entries'").scalar()
+    if "AUTOINCREMENT" not in sql.upper():
+        table = models.WorkEntry.__table__
+        columns = ", ".join(column.name for column in table.columns)
+        conn.exec_driver_sql("ALTER TABLE work_entries RENAME TO work_entries_old")
+        for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'work_entries_old' AND sql IS NOT NULL"
+        ).all():
+            conn.exec_driver_sql(f"DROP INDEX {name}")
+        table.create(bind=conn)
+        conn.exec_driver_sql(f"INSERT INTO work_entries ({columns}) SELECT {columns} FROM work_entries_old")
+        conn.exec_driver_sql("DROP TABLE work_entries_old")
+    session = Session(bind=conn)
+    archive.renumber_conflicts(session)
+    archive.sync_sequence(session)
+    session.close()
+
+MIGRATIONS = [
+    (1, "baseline tables", _baseline),
+    (2, "work_entries indexes (user_id, date), (user_id, created_at), (created_at)", _work_entries_indexes),
+    (3, "work_entries covering index for analytics", _work_entries_indexes),
+    (4, "work_entries_archive table for closed years", _archive_table),
+    (5, "work_entries AUTOINCREMENT: ids never reused by archived entries", _work_entries_autoincrement),
+    (6, "work_entries_archive (created_at) index for recent activity", _archive_table),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+# With several processes (or in Docker) apply the schema once with
+# "python migrations.py upgrade" before starting and set AUTO_MIGRATE=0
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+def applied_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return current_version(conn)
+
+def upgrade(engine: Engine):
+    with engine.begin() as conn:
+        version = current_version(conn)
+        for target, description, migrate in MIGRATIONS:
+            if target <= version:
+                continue
+            print(f"Applying migration {target}: {description}")
+            migrate(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+            version = target
+    # Databases from before the monthly rollup: build it once, here rather than in
+    # every worker's startup (they would all rebuild at the same time)
+    with Session(bind=engine) as session:
+        rollups.ensure_built(session)
+    return version
+
+# --- Query plan check ---
+# The hot-path queries, with sample parameters. If any of them goes back to walking
+# a whole table (SCAN without an index), check() fails.
+
+def hot_queries():
+    entry = models.WorkEntry
+    start, end = date(2024, 1, 1), date(2024, 1, 31)
+    rollup = models.MonthlyRollup
+    archived = archive.union_all_entries()
+    recent = archive.latest(5, include_archive=True)
+    return {
+        "read_work_entries": select(entry)
+            .where(entry.user_id == 1, entry.date >= start, entry.date <= end)
+            .order_by(entry.date.desc()).limit(100),
+        "read_work_entries.cursor": select(entry)
+            .where(entry.user_id == 1, tuple_(entry.date, entry.id) < (end, 1000))
+            .order_by(entry.date.desc(), entry.id.desc()).limit(100),
+        "read_work_entries.archive": select(archived.c.date, archived.c.id)
+            .where(archived.c.user_id == 1, archived.c.date >= start)
+            .order_by(archived.c.date.desc(), archived.c.id.desc()).limit(100),
+        "export_user_month": exports.build_query(
+            schemas.ExportFilters(user_id=1, date_from=start, date_to=end), layout="user"
+        ),
+        "get_monthly_stats": select(rollup)
+            .where(rollup.user_id == 1, rollup.year >= 2024, rollup.year <= 2025),
+        "get_summary.recent_entries": select(recent, models.User)
+            .join(models.User, recent.c.user_id == models.User.id).order_by(recent.c.created_at.desc()),
+        "list_users.last_activity": select(func.max(entry.created_at)).where(entry.user_id == 1),
+        "analytics": analytics.build_query(["worker", "task"], "month", start, end)[0],
+        "analytics.unfiltered": analytics.build_query(["worker", "task"], "month")[0],
+        "update_work_entry": select(entry).where(entry.id == 1, entry.user_id == 1),
+        "login": select(models.User).where(models.User.username == "admin"),
+    }
+
+# Queries that must be answered from a covering index alone: walking another index
+# with a table lookup per row is worse than the full scan itself
+COVERING_QUERIES = {"analytics", "analytics.unfiltered"}
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+TABLE_LOOKUPS = re.compile(r"^(?:SCAN|SEARCH) (\w+) USING INDEX ")
+
+def explain(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    positional = tuple(params[name] for name in compiled.positiontup or ())
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", positional).all()
+    return [row[-1] for row in rows]
+
+def check(engine: Engine, queries: dict = None) -> list:
+    """Returns [(name, detail)] for the queries that do a full scan (or, for those in
+    COVERING_QUERIES, that don't use a covering index)."""
+    tables = set(models.Base.metadata.tables)
+    failures = []
+    with engine.connect() as conn:
+        for name, stmt in (queries or hot_queries()).items():
+            for detail in explain(conn, stmt):
+                match = FULL_SCAN.match(detail)
+                if not match and name in COVERING_QUERIES:
+                    match = TABLE_LOOKUPS.match(detail)
+                if match and match.group(1) in tables:
+                    failures.append((name, detail))
+    return failures
+
+if __name__ == "__main__":
+    from database import engine
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if command == "upgrade":
+        print(f"✅ Schema at version {upgrade(engine)}")
+    elif command == "check":
+        upgrade(engine)
+        failures = check(engine)
+        for name, detail in failures:
+            print(f"❌ {name}: {detail}")
+        if failures:
+            sys.exit(1)
+        print(f"✅ {len(hot_queries())} hot queries use indexes")
+    else:
+        with engine.connect() as conn:
+            print(f"Schema version: {current_version(conn)} (latest: {LATEST})")
+        print("Uso: python migrations.py [status|upgrade|check]")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -27,8 +27,57 @@ class WorkEntry(Base):
 
     owner = relationship("User", back_populates="entries")
 
+    # Hot paths: per-user date ranges (listing, exports), per-user last activity and
+    # global recent activity. Created on existing databases by migrations.py
+    __table_args__ = (
+        Index("ix_work_entries_user_date", "user_id", "date"),
+        Index("ix_work_entries_user_created", "user_id", "created_at"),
+        Index("ix_work_entries_created_at", "created_at"),
+        # Covering index for the analytics cube (GROUP BY without table lookups)
+        Index("ix_work_entries_cube", "date", "user_id", "task", "shift", "amount"),
+        # Ids are never reused: archived entries keep theirs (migrations.py, version 5)
+        {"sqlite_autoincrement": True},
+    )
+
+class WorkEntryArchive(Base):
+    __tablename__ = "work_entries_archive"
+
+    # Entries from closed years moved by archive.py (same columns and ids as
+    # work_entries). Read-only: routes union them in when the range asks for it
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    shift = Column(String)
+    task = Column(String)
+    amount = Column(Float)
+    created_at = Column(DateTime)
+    user_id = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_work_entries_archive_user_date", "user_id", "date"),
+        Index("ix_work_entries_archive_user_created", "user_id", "created_at"),
+        Index("ix_work_entries_archive_created_at", "created_at"),
+        Index("ix_work_entries_archive_cube", "date", "user_id", "task", "shift", "amount"),
+    )
+
 class AnnualRate(Base):
     __tablename__ = "annual_rates"
 
     year = Column(Integer, primary_key=True)
     rate = Column(Float) # Euros per hour
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollups"
+
+    # PK (user_id, year, month) -> doubles as the index for range queries
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    hours = Column(Float, default=0)
+    entries = Column(Integer, default=0)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # "global", "user:<id>", "month:YYYY-MM"... Bumped on every write ("archive" holds a year)
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
@@ -0,0 +1,89 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+
+# Hazardous-hours payroll for every worker at once: one grouped query (monthly
+# rollup), the rates in memory and the hours x rate product done with
+# pandas/NumPy over the whole matrix.
+
+def compute(db: Session, year_from: int, year_to: int) -> dict:
+    import numpy as np
+    import pandas as pd
+
+    rollup = models.MonthlyRollup
+    hours = pd.DataFrame(
+        db.execute(
+            select(
+                rollup.user_id, models.User.username, models.User.full_name,
+                rollup.year, rollup.month, rollup.hours,
+            )
+            .join(models.User, models.User.id == rollup.user_id)
+            .where(rollup.year >= year_from, rollup.year <= year_to, rollup.entries > 0)
+        ).all(),
+        columns=["user_id", "username", "full_name", "year", "month", "hours"],
+    )
+    rates = pd.DataFrame(
+        db.execute(select(models.AnnualRate.year, models.AnnualRate.rate)).all(),
+        columns=["year", "rate"],
+    )
+
+    periods = pd.MultiIndex.from_product(
+        [range(year_from, year_to + 1), range(1, 13)], names=["year", "month"]
+    )
+    period_labels = [f"{y}-{m:02d}" for y, m in periods]
+    year_rates = rates.set_index("year")["rate"].reindex(range(year_from, year_to + 1))
+
+    if hours.empty:
+        zeros = [0.0] * len(periods)
+        return {
+            "periods": period_labels,
+            "rates": {int(y): (None if pd.isna(r) else float(r)) for y, r in year_rates.items()},
+            "workers": [],
+            "totals": {"hours": zeros, "euros": zeros, "total_hours": 0.0, "total_euros": 0.0},
+        }
+
+    # Vectorized join + product: one rate per row, missing rates count as 0 €
+    hours = hours.merge(rates, on="year", how="left")
+    hours["rate"] = hours["rate"].fillna(0.0)
+    hours["euros"] = hours["hours"].to_numpy() * hours["rate"].to_numpy()
+
+    # Pivot on user_id only (names may be NULL and pivot_table drops NaN keys)
+    hours_matrix = hours.pivot_table(index="user_id", columns=["year", "month"], values="hours", aggfunc="sum", fill_value=0.0)
+    euros_matrix = hours.pivot_table(index="user_id", columns=["year", "month"], values="euros", aggfunc="sum", fill_value=0.0)
+    names = hours.drop_duplicates("user_id").set_index("user_id")[["username", "full_name"]]
+    names = names.astype(object).where(names.notna(), None).reindex(hours_matrix.index)
+    hours_matrix = hours_matrix.reindex(columns=periods, fill_value=0.0)
+    euros_matrix = euros_matrix.reindex(columns=periods, fill_value=0.0)
+
+    hours_values = np.round(hours_matrix.to_numpy(dtype=float), 2)
+    euros_values = np.round(euros_matrix.to_numpy(dtype=float), 2)
+    hours_totals = hours_values.sum(axis=1)
+    euros_totals = euros_values.sum(axis=1)
+
+    workers = [
+        {
+            "user_id": int(user_id),
+            "username": username,
+            "full_name": full_name,
+            "hours": hours_row,
+            "euros": euros_row,
+            "total_hours": round(float(total_hours), 2),
+            "total_euros": round(float(total_euros), 2),
+        }
+        for user_id, username, full_name, hours_row, euros_row, total_hours, total_euros in zip(
+            hours_matrix.index, names["username"], names["full_name"],
+            hours_values.tolist(), euros_values.tolist(), hours_totals, euros_totals,
+        )
+    ]
+
+    return {
+        "periods": period_labels,
+        "rates": {int(y): (None if pd.isna(r) else float(r)) for y, r in year_rates.items()},
+        "workers": workers,
+        "totals": {
+            "hours": np.round(hours_values.sum(axis=0), 2).tolist(),
+            "euros": np.round(euros_values.sum(axis=0), 2).tolist(),
+            "total_hours": round(float(hours_totals.sum()), 2),
+            "total_euros": round(float(euros_totals.sum()), 2),
+        },
+    }
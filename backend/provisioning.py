@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Tuple
+import bcrypt
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+import models, schemas, auth, versioning
+
+# Bulk user creation: one IN query per batch to find duplicates, bcrypt spread
+# across processes and batched inserts. Each batch is hashed before writing and
+# committed when done: the SQLite write lock is only held during the insert, never
+# while the next batch is being hashed.
+
+PROVISION_HASH_PROCESSES = int(os.getenv("PROVISION_HASH_PROCESSES", str(os.cpu_count() or 2)))
+PROVISION_BATCH_SIZE = int(os.getenv("PROVISION_BATCH_SIZE", "500"))
+
+# Spanish headers accepted in uploaded files
+COLUMN_ALIASES = {
+    "usuario": "username",
+    "nombre": "full_name",
+    "nombre completo": "full_name",
+    "contraseña": "password",
+    "clave": "password",
+    "rol": "role",
+}
+
+_process_pool = None
+
+def _hash_chunk(passwords, rounds):
+    # Runs in a worker process
+    return [bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8") for p in passwords]
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that already runs threads (uvicorn, pools) is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROVISION_HASH_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+def hash_passwords(passwords: list) -> list:
+    if len(passwords) <= 1 or PROVISION_HASH_PROCESSES <= 1:
+        return _hash_chunk(passwords, auth.BCRYPT_ROUNDS)
+    size = -(-len(passwords) // PROVISION_HASH_PROCESSES)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    hashed = []
+    for part in _get_process_pool().map(_hash_chunk, chunks, [auth.BCRYPT_ROUNDS] * len(chunks)):
+        hashed.extend(part)
+    return hashed
+
+def _normalize(raw: dict) -> dict:
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        name = str(key).strip().lower()
+        name = COLUMN_ALIASES.get(name, name)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        row[name] = str(value) if name in ("username", "password") else value
+    return row
+
+def _provision_batch(db: Session, batch: list, seen: set, report: schemas.BulkUserReport):
+    valid = []
+    for number, raw in batch:
+        try:
+            user = schemas.UserCreate(**_normalize(raw))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(p) for p in error["loc"])
+            report.results.append(schemas.BulkUserResult(
+                row=number, username=raw.get("username"), status="failed", detail=f"{field}: {error['msg']}"
+            ))
+            continue
+        if user.username in seen:
+            report.results.append(schemas.BulkUserResult(
+                row=number, username=user.username, status="skipped", detail="Duplicated in this upload"
+            ))
+            continue
+        seen.add(user.username)
+        valid.append((number, user))
+
+    if not valid:
+        return 0
+
+    # One IN query per batch instead of one SELECT per user
+    usernames = [user.username for _, user in valid]
+    existing = {
+        name for (name,) in db.query(models.User.username).filter(models.User.username.in_(usernames))
+    }
+    new = []
+    for number, user in valid:
+        if user.username in existing:
+            report.results.append(schemas.BulkUserResult(
+                row=number, username=user.username, status="skipped", detail=f"User {user.username} already exists"
+            ))
+        else:
+            new.append((number, user))
+    if not new:
+        return 0
+
+    # bcrypt before the INSERT: the write transaction only starts with it
+    hashes = hash_passwords([user.password for _, user in new])
+    params = [
+        {"username": user.username, "full_name": user.full_name, "hashed_password": hashed, "role": user.role}
+        for (_, user), hashed in zip(new, hashes)
+    ]
+    inserted = db.execute(
+        insert(models.User).returning(models.User.id, models.User.username, sort_by_parameter_order=True),
+        params,
+    ).all()
+    for (number, user), row in zip(new, inserted):
+        report.results.append(schemas.BulkUserResult(row=number, username=user.username, status="created", id=row.id))
+    return len(inserted)
+
+def provision(db: Session, rows: Iterable[Tuple[int, dict]]) -> schemas.BulkUserReport:
+    report = schemas.BulkUserReport()
+    seen = set()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, PROVISION_BATCH_SIZE))
+        if not batch:
+            break
+        if _provision_batch(db, batch, seen, report):
+            versioning.bump(db)
+            db.commit()
+
+    report.created = sum(1 for r in report.results if r.status == "created")
+    report.skipped = sum(1 for r in report.results if r.status == "skipped")
+    report.failed = sum(1 for r in report.results if r.status == "failed")
+    report.results.sort(key=lambda r: r.row)
+    return report
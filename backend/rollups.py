@@ -0,0 +1,136 @@
+from datetime import date
+from sqlalchemy import func, tuple_, cast, Integer
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+import models, archive, versioning
+
+# Monthly rollup (user, year, month) -> hours and number of entries.
+# Updated in the same transaction as the WorkEntry writes, so the stats read a few
+# rows instead of walking the whole history. Every change also bumps the counter
+# of the month it touches (versioning.month_scope).
+
+# Hours are floats added and subtracted one write at a time: the running total is
+# rounded so the error never builds up (a month emptied by deletes is exactly 0)
+HOURS_DECIMALS = 9
+
+def _upsert_statement():
+    stmt = insert(models.MonthlyRollup)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "year", "month"],
+        set_={
+            "hours": func.round(models.MonthlyRollup.hours + stmt.excluded.hours, HOURS_DECIMALS),
+            "entries": models.MonthlyRollup.entries + stmt.excluded.entries,
+        },
+    )
+
+def _drop_empty(db: Session, keys):
+    # Months left without entries go away instead of staying as 0-hour rows
+    rollup = models.MonthlyRollup
+    db.query(rollup).filter(
+        tuple_(rollup.user_id, rollup.year, rollup.month).in_(keys),
+        rollup.entries <= 0,
+    ).delete(synchronize_session=False)
+
+def apply_delta(db: Session, user_id: int, entry_date: date, hours: float, count: int):
+    if user_id is None or entry_date is None:
+        return
+    db.execute(_upsert_statement(), {
+        "user_id": user_id,
+        "year": entry_date.year,
+        "month": entry_date.month,
+        "hours": hours,
+        "entries": count,
+    })
+    _drop_empty(db, [(user_id, entry_date.year, entry_date.month)])
+    versioning.bump_months(db, [(entry_date.year, entry_date.month)])
+
+def apply_entries(db: Session, rows, removed=()):
+    """Batch version: rows are dicts with user_id, date and amount (new entries);
+    removed, the ones going out (deleted, or the old values of an edit)."""
+    deltas = {}
+    for sign, entries in ((1, rows), (-1, removed)):
+        for row in entries:
+            if row["user_id"] is None or row["date"] is None:
+                continue
+            key = (row["user_id"], row["date"].year, row["date"].month)
+            hours, count = deltas.get(key, (0, 0))
+            deltas[key] = (hours + sign * (row["amount"] or 0), count + sign)
+    if deltas:
+        db.execute(_upsert_statement(), [
+            {"user_id": user_id, "year": year, "month": month, "hours": hours, "entries": count}
+            for (user_id, year, month), (hours, count) in deltas.items()
+        ])
+        _drop_empty(db, list(deltas))
+        versioning.bump_months(db, [(year, month) for _, year, month in deltas])
+
+def add_entry(db: Session, entry: models.WorkEntry):
+    apply_delta(db, entry.user_id, entry.date, entry.amount or 0, 1)
+
+def remove_entry(db: Session, entry: models.WorkEntry):
+    apply_delta(db, entry.user_id, entry.date, -(entry.amount or 0), -1)
+
+def get_range(db: Session, user_id: int, start: tuple, end: tuple):
+    """Rollup rows between (year, month) start and end, both included."""
+    period = tuple_(models.MonthlyRollup.year, models.MonthlyRollup.month)
+    return db.query(models.MonthlyRollup).filter(
+        models.MonthlyRollup.user_id == user_id,
+        period >= start,
+        period <= end,
+    ).all()
+
+def delete_user(db: Session, user_id: int):
+    rollup = models.MonthlyRollup
+    months = db.query(rollup.year, rollup.month).filter(rollup.user_id == user_id).all()
+    versioning.bump_months(db, months)
+    db.query(models.MonthlyRollup).filter(models.MonthlyRollup.user_id == user_id).delete()
+
+def rebuild(db: Session):
+    """Rebuilds the whole table from work_entries and the archive (for existing databases)."""
+    entry = archive.entries().c
+    year = cast(func.strftime("%Y", entry.date), Integer)
+    month = cast(func.strftime("%m", entry.date), Integer)
+    grouped = db.query(
+        entry.user_id,
+        year,
+        month,
+        func.round(func.sum(entry.amount), HOURS_DECIMALS),
+        func.count(entry.id),
+    ).filter(
+        entry.user_id.isnot(None),
+        entry.date.isnot(None),
+    ).group_by(entry.user_id, year, month)
+
+    db.query(models.MonthlyRollup).delete()
+    db.execute(
+        insert(models.MonthlyRollup).from_select(
+            ["user_id", "year", "month", "hours", "entries"], grouped
+        )
+    )
+    versioning.bump_months(db, db.query(models.MonthlyRollup.year, models.MonthlyRollup.month).distinct().all())
+    db.commit()
+    return db.query(models.MonthlyRollup).count()
+
+def ensure_built(db: Session):
+    # Databases from before the rollup: empty table but existing entries -> rebuild once
+    has_rollups = db.query(models.MonthlyRollup.user_id).first() is not None
+    has_entries = db.query(models.WorkEntry.id).first() is not None
+    if has_entries and not has_rollups:
+        print("Rebuilding monthly rollups from existing entries...")
+        return rebuild(db)
+    return None
+
+if __name__ == "__main__":
+    import sys
+    from database import SessionLocal, engine
+    import migrations
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        migrations.upgrade(engine)
+        session = SessionLocal()
+        try:
+            rows = rebuild(session)
+            print(f"✅ Rollup reconstruido: {rows} filas (usuario/mes).")
+        finally:
+            session.close()
+    else:
+        print("Uso: python rollups.py rebuild")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import date, datetime
 
@@ -33,13 +33,19 @@ class UserCreate(UserBase):
     role: Optional[str] = "user"
 
 class User(UserBase):
+    # Lean on purpose: a worker's entries are served by /entries/, never nested here
     id: int
     role: str
-    entries: List[WorkEntry] = []
 
     class Config:
         from_attributes = True
 
+class UserSummary(User):
+    entry_count: int = 0
+    hours_month: float = 0
+    hours_year: float = 0
+    last_activity: Optional[datetime] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -57,3 +63,88 @@ class AnnualRate(BaseModel):
 class UserPasswordUpdate(BaseModel):
     old_password: str
     new_password: str
+
+class ExportFilters(BaseModel):
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    user_id: Optional[int] = None
+    task: Optional[str] = None
+
+class ExportRequest(ExportFilters):
+    format: str = Field("xlsx", pattern="^(xlsx|csv)$")
+
+class ExportJob(BaseModel):
+    id: str
+    status: str # queued, running, done, failed
+    format: str
+    rows: int
+    total_rows: Optional[int] = None
+    progress: float
+    cached: bool
+    error: Optional[str] = None
+
+class BulkUserResult(BaseModel):
+    row: int
+    username: Optional[str] = None
+    status: str # created, skipped, failed
+    detail: Optional[str] = None
+    id: Optional[int] = None
+
+class BulkUserReport(BaseModel):
+    created: int = 0
+    skipped: int = 0
+    failed: int = 0
+    results: List[BulkUserResult] = []
+
+class EntryBatchOperation(BaseModel):
+    op: str = Field(pattern="^(create|update|delete)$")
+    id: Optional[int] = None # update, delete
+    entry: Optional[WorkEntryBase] = None # create, update (all fields, like PUT /entries/{id})
+
+class EntryBatchResult(BaseModel):
+    row: int
+    op: Optional[str] = None
+    status: str # created, updated, deleted, failed, skipped (batch not applied)
+    id: Optional[int] = None
+    entry: Optional[WorkEntry] = None
+    detail: Optional[str] = None
+
+class EntryBatchReport(BaseModel):
+    applied: bool = False
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    failed: int = 0
+    results: List[EntryBatchResult] = []
+
+class RowError(BaseModel):
+    row: int
+    detail: str
+
+class EntryImportReport(BaseModel):
+    dry_run: bool = False
+    total_rows: int = 0
+    valid: int = 0
+    imported: int = 0
+    errors: List[RowError] = []
+
+class PayrollWorker(BaseModel):
+    user_id: int
+    username: str
+    full_name: Optional[str] = None
+    hours: List[float]
+    euros: List[float]
+    total_hours: float
+    total_euros: float
+
+class PayrollTotals(BaseModel):
+    hours: List[float]
+    euros: List[float]
+    total_hours: float
+    total_euros: float
+
+class Payroll(BaseModel):
+    periods: List[str] # "YYYY-MM", same order as the hours/euros lists
+    rates: dict
+    workers: List[PayrollWorker]
+    totals: PayrollTotals
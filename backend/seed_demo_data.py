@@ -5,9 +5,12 @@ from database import SessionLocal, engine
 import models
 import auth
 import calendar
+import rollups
+import versioning
+import migrations
 
 # Initialize tables if not exist (ensures script works even on fresh db)
-models.Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 def seed_data():
     db: Session = SessionLocal()
@@ -112,6 +115,11 @@ def seed_data():
             db.commit()
             print(f"  Commit successful for {username}")
 
+        # Entries were added straight through the ORM: refresh the derived tables
+        rollups.rebuild(db)
+        versioning.bump(db)
+        db.commit()
+
     except Exception as e:
         print(f"Error seeding data: {e}")
         db.rollback()
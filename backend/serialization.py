@@ -0,0 +1,33 @@
+import json
+import os
+from datetime import date, datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError: # optional: without orjson the stdlib json is used
+    orjson = None
+
+# Fast path for trusted rows (just read from the DB as column tuples): they are
+# encoded directly, skipping the response_model Pydantic models. The JSON contract
+# is the same as in schemas.py.
+
+# Compress responses from this size in bytes (0 = disabled)
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "0"))
+
+def _default(obj):
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    if hasattr(obj, "item"): # numpy scalars (payroll)
+        return obj.item()
+    return jsonable_encoder(obj)
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
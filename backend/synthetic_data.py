@@ -0,0 +1,170 @@
+"""Synthetic data generator for load and capacity tests.
+
+Creates N workers with Y years of hour entries drawn from realistic distributions
+(more morning than night shifts, more and less active workers, hours in quarters).
+Every draw comes from a single seeded NumPy generator, so the same command always
+produces the same DB. Users share one password hash and entries are written with
+batched core inserts.
+
+    python synthetic_data.py --workers 5000 --years 5 --seed 7
+"""
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+from sqlalchemy import column, func, insert, select, table
+from sqlalchemy.orm import Session
+
+import auth
+import models
+import rollups
+import versioning
+
+SYNTHETIC_BATCH_SIZE = 50000
+
+SHIFTS = np.array(["Mañana", "Tarde", "Noche"])
+SHIFT_WEIGHTS = [0.45, 0.35, 0.20]
+TASKS = np.array(["Sacos", "Quemadores", "Filtros FO/Lodos", "Magnesio", "Derrames/Fugas"])
+TASK_WEIGHTS = [0.35, 0.25, 0.20, 0.12, 0.08]
+# Approximate clock-in time per shift (created_at)
+SHIFT_START_HOUR = np.array([6, 14, 22])
+
+# Lightweight untyped table: values are already formatted the way SQLite stores
+# them (ISO dates), so the INSERT is compiled once and executemany gets tuples
+# without going through the bind processors row by row
+_entries = table(
+    "work_entries",
+    column("user_id"), column("date"), column("shift"), column("task"), column("amount"), column("created_at"),
+)
+
+def _months(years: int, today: date):
+    """datetime64[M] array with every month from January `years - 1` years ago up to today."""
+    first = np.datetime64(f"{today.year - years + 1}-01", "M")
+    return np.arange(first, np.datetime64(today, "M") + 1)
+
+def generate_entries(rng: np.random.Generator, user_ids, years: int, entries_per_month: float = 10, today: date = None):
+    """NumPy columns with the entries of `user_ids` (the DB is not touched).
+
+    Each worker has their own intensity (gamma with mean 1) and a Poisson number of
+    entries per month; the current month only runs up to today.
+    """
+    today = today or date.today()
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    months = _months(years, today)
+
+    intensity = rng.gamma(shape=4.0, scale=0.25, size=len(user_ids))
+    counts = rng.poisson(np.outer(intensity, np.full(len(months), entries_per_month)))
+    counts[:, -1] = rng.binomial(counts[:, -1], today.day / 31)
+    counts = counts.ravel()
+
+    total = int(counts.sum())
+    user = np.repeat(np.repeat(user_ids, len(months)), counts)
+    month = np.repeat(np.tile(months, len(user_ids)), counts)
+
+    # Day within the month (never past today in the current month)
+    month_start = month.astype("datetime64[D]")
+    month_days = ((month + 1).astype("datetime64[D]") - month_start).astype(np.int64)
+    current = month == months[-1]
+    month_days[current] = today.day
+    day = month_start + (rng.random(total) * month_days).astype(np.int64)
+
+    shift = rng.choice(len(SHIFTS), size=total, p=SHIFT_WEIGHTS)
+    task = rng.choice(len(TASKS), size=total, p=TASK_WEIGHTS)
+    # Hours in quarters, mostly between 1 and 4
+    amount = np.clip(np.round(rng.lognormal(mean=0.8, sigma=0.5, size=total) * 4) / 4, 0.25, 8.0)
+    created = (
+        day.astype("datetime64[s]")
+        + (SHIFT_START_HOUR[shift] * 3600 + rng.integers(0, 8 * 3600, size=total)).astype("timedelta64[s]")
+    )
+    return {"user_id": user, "date": day, "shift": shift, "task": task, "amount": amount, "created_at": created}
+
+def _entry_rows(columns, start: int, stop: int):
+    created = np.char.add(
+        np.char.replace(np.datetime_as_string(columns["created_at"][start:stop], unit="s"), "T", " "), ".000000"
+    )
+    return list(zip(
+        columns["user_id"][start:stop].tolist(),
+        np.datetime_as_string(columns["date"][start:stop], unit="D").tolist(),
+        SHIFTS[columns["shift"][start:stop]].tolist(),
+        TASKS[columns["task"][start:stop]].tolist(),
+        columns["amount"][start:stop].tolist(),
+        created.tolist(),
+    ))
+
+def _insert_entries(db: Session, columns):
+    """Inserts in batches. If the load is bigger than what the table already holds,
+    the secondary indexes are dropped and rebuilt at the end: building an index in
+    one go is much faster than maintaining it row by row."""
+    total = len(columns["user_id"])
+    conn = db.connection()
+    existing = conn.scalar(select(func.count()).select_from(models.WorkEntry.__table__))
+    indexes = list(models.WorkEntry.__table__.indexes) if total > existing else []
+    for index in indexes:
+        index.drop(conn, checkfirst=True)
+
+    sql = str(insert(_entries).compile(dialect=conn.dialect))
+    for start in range(0, total, SYNTHETIC_BATCH_SIZE):
+        conn.exec_driver_sql(sql, _entry_rows(columns, start, min(start + SYNTHETIC_BATCH_SIZE, total)))
+
+    for index in indexes:
+        index.create(conn)
+    return total
+
+def generate(db: Session, workers: int, years: int, seed: int = 42, entries_per_month: float = 10,
+             password: str = "demo123", prefix: str = "w", today: date = None):
+    """Creates workers `<prefix>00000`... with their entries and rates for any
+    missing years, then rebuilds the rollups. Returns (users, entries)."""
+    today = today or date.today()
+    rng = np.random.default_rng(seed)
+    hashed = auth.get_password_hash(password)
+
+    # No RETURNING (with guaranteed order SQLite would do it row by row): the new
+    # ids are the ones after the current maximum, in insertion order
+    last_id = db.scalar(select(func.max(models.User.id))) or 0
+    db.execute(insert(models.User.__table__), [
+        {"username": f"{prefix}{i:05d}", "full_name": f"Trabajador {i}", "hashed_password": hashed, "role": "user"}
+        for i in range(workers)
+    ])
+    user_ids = db.scalars(select(models.User.id).where(models.User.id > last_id).order_by(models.User.id)).all()
+
+    first_year = today.year - years + 1
+    existing = set(db.scalars(select(models.AnnualRate.year)).all())
+    missing = [year for year in range(first_year, today.year + 1) if year not in existing]
+    if missing:
+        db.execute(insert(models.AnnualRate.__table__), [
+            {"year": year, "rate": round(10 + (year - first_year) * 0.5, 2)} for year in missing
+        ])
+
+    total = _insert_entries(db, generate_entries(rng, user_ids, years, entries_per_month, today))
+    db.commit()
+    rollups.rebuild(db)
+    versioning.bump(db)
+    db.commit()
+    return len(user_ids), total
+
+
+if __name__ == "__main__":
+    import database
+    import migrations
+
+    parser = argparse.ArgumentParser(description="Genera trabajadores y partes sintéticos")
+    parser.add_argument("--workers", type=int, default=100)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--entries-per-month", type=float, default=10)
+    parser.add_argument("--password", default="demo123")
+    parser.add_argument("--prefix", default="w")
+    parser.add_argument("--until", type=date.fromisoformat, default=None,
+                        help="fecha final YYYY-MM-DD (por defecto hoy); fíjala para reproducir una BD otro día")
+    args = parser.parse_args()
+
+    migrations.upgrade(database.engine)
+    db = database.SessionLocal()
+    try:
+        start = time.perf_counter()
+        users, entries = generate(db, args.workers, args.years, args.seed, args.entries_per_month,
+                                  args.password, args.prefix, args.until)
+        print(f"Creados {users} trabajadores y {entries} partes en {time.perf_counter() - start:.1f}s ({database.DB_PATH})")
+    finally:
+        db.close()
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The database path is fixed when database.py is imported: point it at a scratch
+# directory before any backend module is loaded
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="penosas-tests-"))
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("ADMIN_PASSWORD", "admin123")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def login(client, username, password):
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    return login(client, os.getenv("ADMIN_USER", "admin"), os.environ["ADMIN_PASSWORD"])
+
+
+@pytest.fixture
+def make_user(client, admin_headers):
+    def create(username, full_name=None, password="pw123456"):
+        response = client.post(
+            "/users/",
+            json={"username": username, "full_name": full_name or username, "password": password, "role": "user"},
+            headers=admin_headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["id"], login(client, username, password)
+    return create
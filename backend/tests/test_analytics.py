@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, literal, select
+from sqlalchemy.types import Date
+
+import analytics
+
+
+def test_week_period_is_iso_8601_across_year_boundaries():
+    engine = create_engine("sqlite://")
+    days = [date(year, 12, 24) + timedelta(days=i) for year in range(2019, 2028) for i in range(16)]
+    with engine.connect() as conn:
+        for day in days:
+            label = conn.scalar(select(analytics.PERIODS["week"](literal(day, Date))))
+            iso_year, iso_week, _ = day.isocalendar()
+            assert label == f"{iso_year}-W{iso_week:02d}", day
+
+
+def test_week_period_examples():
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        week = lambda day: conn.scalar(select(analytics.PERIODS["week"](literal(day, Date))))
+        assert week(date(2024, 12, 30)) == "2025-W01"
+        assert week(date(2023, 1, 1)) == "2022-W52"
+        assert week(date(2027, 1, 1)) == "2026-W53"
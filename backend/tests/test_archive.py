@@ -0,0 +1,17 @@
+def _entry(day, task="Sacos"):
+    return {"date": day, "shift": "Mañana", "task": task, "amount": 1}
+
+
+def test_summary_recent_activity_includes_archived_rows(client, admin_headers, make_user):
+    _, headers = make_user("archivo1")
+    for day in ("2025-03-01", "2025-03-02", "2025-03-03"):
+        assert client.post("/entries/", json=_entry(day), headers=headers).status_code == 200
+    # Created after the entries above, but dated in a year that gets archived
+    old = [_entry("2019-05-01", "Filtros"), _entry("2019-05-02", "Filtros")]
+    assert client.post("/entries/bulk", json=old, headers=headers).status_code == 200
+    response = client.post("/admin/archive?before_year=2020", headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    recent = client.get("/admin/summary", headers=admin_headers).json()["recent_activity"]
+    assert len(recent) == 5
+    assert [r["task"] for r in recent[:2]] == ["Filtros", "Filtros"]
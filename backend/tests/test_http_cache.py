@@ -0,0 +1,8 @@
+def test_if_none_match_star_is_not_a_validator(client, make_user):
+    _, headers = make_user("etag1")
+    response = client.get("/entries/stats/monthly", headers={**headers, "If-None-Match": "*"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/entries/stats/monthly", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
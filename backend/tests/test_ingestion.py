@@ -0,0 +1,58 @@
+import io
+
+import uploads
+
+
+def test_read_upload_accepts_windows_1252_csv():
+    data = "usuario,fecha,turno,tarea,horas\nnuñez,2024-03-05,Mañana,Sacos,\"1,5\"\n".encode("cp1252")
+    rows = uploads.read_upload("horas.csv", io.BytesIO(data))
+    assert rows[0][1]["usuario"] == "nuñez"
+    assert rows[0][1]["turno"] == "Mañana"
+
+
+def test_import_latin1_csv(client, admin_headers, make_user):
+    make_user("ibáñez")
+    data = "usuario,fecha,turno,tarea,horas\nibáñez,2024-03-05,Mañana,Sacos,\"1,5\"\n".encode("latin-1")
+    response = client.post(
+        "/admin/entries/import",
+        files={"file": ("horas.csv", data, "text/csv")},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["imported"] == 1
+
+
+def test_import_rejects_undecodable_csv(client, admin_headers):
+    response = client.post(
+        "/admin/entries/import",
+        files={"file": ("horas.csv", b"usuario,fecha\n\x81\x8d,2024-03-05\n", "text/csv")},
+        headers=admin_headers,
+    )
+    assert response.status_code == 400
+    assert "UTF-8" in response.json()["detail"]
+
+
+def test_import_rejects_corrupt_xlsx(client, admin_headers):
+    response = client.post(
+        "/admin/entries/import",
+        files={"file": ("horas.xlsx", b"not a zip file", "application/octet-stream")},
+        headers=admin_headers,
+    )
+    assert response.status_code == 400
+    assert "XLSX" in response.json()["detail"]
+
+
+def test_import_reports_ambiguous_full_name(client, admin_headers, make_user):
+    make_user("garcia1", full_name="Ana García")
+    make_user("garcia2", full_name="Ana García")
+    data = "full_name,fecha,turno,tarea,horas\nAna García,2024-03-05,Mañana,Sacos,1\n".encode("utf-8")
+    response = client.post(
+        "/admin/entries/import",
+        files={"file": ("horas.csv", data, "text/csv")},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["imported"] == 0
+    assert report["errors"][0]["row"] == 2
+    assert "Ambiguous worker" in report["errors"][0]["detail"]
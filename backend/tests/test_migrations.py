@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine
+
+import migrations
+
+
+def test_upgrade_reaches_latest_and_hot_queries_use_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    try:
+        assert migrations.upgrade(engine) == migrations.LATEST
+        assert migrations.check(engine) == []
+    finally:
+        engine.dispose()
+
+
+def test_check_reports_full_scans(tmp_path):
+    from sqlalchemy import select
+    import models
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    try:
+        migrations.upgrade(engine)
+        unindexed = {"by_task": select(models.WorkEntry).where(models.WorkEntry.task == "Sacos")}
+        assert migrations.check(engine, unindexed) == [("by_task", "SCAN work_entries")]
+    finally:
+        engine.dispose()
@@ -0,0 +1,31 @@
+from datetime import date
+
+import database
+import models
+
+
+def test_month_emptied_by_deletes_has_no_rollup_left(client, make_user):
+    user_id, headers = make_user("rollup1")
+    day = date.today().replace(day=1).isoformat()
+    ids = []
+    for amount in (0.1, 0.2, 0.3, 0.7, 1.1):
+        response = client.post("/entries/", json={"date": day, "shift": "Tarde", "task": "Sacos", "amount": amount}, headers=headers)
+        ids.append(response.json()["id"])
+    for entry_id in ids:
+        assert client.delete(f"/entries/{entry_id}", headers=headers).status_code == 200
+
+    db = database.SessionLocal()
+    try:
+        assert db.query(models.MonthlyRollup).filter(models.MonthlyRollup.user_id == user_id).count() == 0
+    finally:
+        db.close()
+    stats = client.get("/entries/stats/monthly", headers=headers).json()
+    assert stats[-1]["hours"] == 0
+
+
+def test_rollup_hours_do_not_drift(client, make_user):
+    user_id, headers = make_user("rollup2")
+    day = date.today().replace(day=1).isoformat()
+    for amount in (0.1, 0.2, 0.3):
+        client.post("/entries/", json={"date": day, "shift": "Tarde", "task": "Sacos", "amount": amount}, headers=headers)
+    assert client.get("/entries/stats/monthly", headers=headers).json()[-1]["hours"] == 0.6
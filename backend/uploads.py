@@ -0,0 +1,65 @@
+import csv
+import io
+import zipfile
+from typing import Callable, List, Optional, Tuple
+
+# Shared reader for spreadsheet uploads (worker rosters, hour imports). The whole
+# file is read and decoded before anything is written, so a malformed upload is
+# rejected up front with UploadError (400) instead of failing halfway through.
+
+# Excel in Spain saves CSVs as Windows-1252 unless told otherwise
+CSV_ENCODINGS = ("utf-8-sig", "cp1252")
+
+class UploadError(ValueError):
+    pass
+
+def _decode(data: bytes) -> str:
+    for encoding in CSV_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise UploadError("CSV file is not UTF-8 or Windows-1252 text")
+
+def _read_xlsx(fileobj, special_sheet: Optional[Callable]) -> List[Tuple[int, dict]]:
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError) as e:
+        raise UploadError(f"Not a valid XLSX file: {e}")
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return []
+        special = special_sheet(header, wb.active) if special_sheet else None
+        if special is not None:
+            return list(special)
+        return [
+            (number, dict(zip(header, values)))
+            for number, values in enumerate(rows, start=2)
+            if any(v is not None for v in values)
+        ]
+    except (zipfile.BadZipFile, KeyError, OSError) as e:
+        raise UploadError(f"Not a valid XLSX file: {e}")
+    finally:
+        wb.close()
+
+def _read_csv(fileobj) -> List[Tuple[int, dict]]:
+    text = _decode(fileobj.read())
+    try:
+        return list(enumerate(csv.DictReader(io.StringIO(text, newline="")), start=2))
+    except csv.Error as e:
+        raise UploadError(f"Malformed CSV file: {e}")
+
+def read_upload(filename: str, fileobj, special_sheet: Optional[Callable] = None) -> List[Tuple[int, dict]]:
+    """Returns [(row number, dict)] from a CSV or XLSX file.
+
+    special_sheet(header, worksheet) may return its own rows for XLSX layouts that
+    are not a plain table (None = read it as a plain table).
+    """
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _read_xlsx(fileobj, special_sheet)
+    return _read_csv(fileobj)
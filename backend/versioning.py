@@ -0,0 +1,155 @@
+import asyncio
+import sqlite3
+import threading
+from contextvars import ContextVar
+from datetime import date
+from typing import Callable
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+import models, database
+
+# Data version counters. Every write bumps the global counter and, when it touches
+# a worker, that worker's one ("user:<id>"), in the same transaction. They tell
+# whether a computed result (e.g. an export) is still current.
+
+GLOBAL = "global"
+RATES = "rates"
+# Changes to a user's identity/role (principal cache)
+PRINCIPALS = "principals"
+# Not a counter: first year still in work_entries (see archive.py)
+ARCHIVE = "archive"
+
+# One counter per month of data ("month:2024-01"), for results that depend on a date
+# range rather than on who writes (admin exports). Bumped by rollups.py
+MONTH_PREFIX = "month:"
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def month_scope(year: int, month: int) -> str:
+    return f"{MONTH_PREFIX}{year:04d}-{month:02d}"
+
+def _increment(db: Session, scope: str):
+    stmt = insert(models.DataVersion).values(scope=scope, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": models.DataVersion.version + 1},
+    )
+    db.execute(stmt)
+
+def bump(db: Session, user_id: int = None, rates: bool = False):
+    _increment(db, GLOBAL)
+    if user_id is not None:
+        _increment(db, user_scope(user_id))
+    if rates:
+        _increment(db, RATES)
+
+def bump_principals(db: Session):
+    _increment(db, PRINCIPALS)
+
+def bump_months(db: Session, months):
+    """Bumps the counter of every (year, month) in months."""
+    scopes = sorted({month_scope(year, month) for year, month in months})
+    if not scopes:
+        return
+    stmt = insert(models.DataVersion)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": models.DataVersion.version + 1},
+    )
+    db.execute(stmt, [{"scope": scope, "version": 1} for scope in scopes])
+
+def months_version(db: Session, start: date = None, end: date = None) -> int:
+    """Sum of the month counters between start and end (None = unbounded).
+
+    Counters never go down and are never deleted, so the sum changes as soon as any
+    month in the range is written and never returns to an earlier value.
+    """
+    # Range on the PK: "month:0000-00" .. "month:9999-99" by default
+    low = month_scope(start.year, start.month) if start else month_scope(0, 0)
+    high = month_scope(end.year, end.month) if end else month_scope(9999, 99)
+    return db.query(func.coalesce(func.sum(models.DataVersion.version), 0)).filter(
+        models.DataVersion.scope.between(low, high)
+    ).scalar()
+
+def advance(db: Session, scope: str, value: int):
+    """Raises a scope's counter to value (never lowers it)."""
+    stmt = insert(models.DataVersion).values(scope=scope, version=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["scope"],
+        set_={"version": func.max(models.DataVersion.version, stmt.excluded.version)},
+    )
+    db.execute(stmt)
+
+def get(db: Session, scope: str = GLOBAL) -> int:
+    version = db.query(models.DataVersion.version).filter(models.DataVersion.scope == scope).scalar()
+    return version or 0
+
+def get_many(db: Session, scopes) -> dict:
+    rows = db.query(models.DataVersion.scope, models.DataVersion.version).filter(
+        models.DataVersion.scope.in_(list(scopes))
+    ).all()
+    versions = {scope: 0 for scope in scopes}
+    versions.update(rows)
+    return versions
+
+class ScopeWatch:
+    """Notices, from any process, that another one has changed a scope.
+
+    With several workers each one keeps its caches in memory. PRAGMA data_version is
+    read on a dedicated connection (it only changes when another connection commits,
+    and reads no pages); only then is the scope's row read again and, if it moved,
+    on_change is called. current() gives the current version.
+
+    Inside a request SQLite is never touched from the event loop: sync_watches()
+    refreshes every watch in a thread once per request and current() returns that
+    value. Outside a request (CLI, jobs in threads) current() refreshes on the spot.
+    """
+
+    def __init__(self, scope: str, on_change: Callable[[], None] = None):
+        self.scope = scope
+        self.on_change = on_change
+        self._conn = None
+        self._data_version = None
+        self._version = None
+        self._lock = threading.Lock()
+        _watches.append(self)
+
+    def _refresh(self):
+        with self._lock:
+            previous = self._version
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(database.DB_PATH, isolation_level=None, check_same_thread=False)
+                data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version != self._data_version:
+                    row = self._conn.execute("SELECT version FROM data_versions WHERE scope = ?", (self.scope,)).fetchone()
+                    self._version = row[0] if row else 0
+                    self._data_version = data_version
+            except sqlite3.Error:
+                pass # table not created yet: retried on the next call
+            version = self._version
+        if self.on_change and previous is not None and version != previous:
+            self.on_change()
+        return version
+
+    def current(self) -> int:
+        if _synced.get():
+            return self._version or 0
+        return self._refresh() or 0
+
+_watches = []
+# True inside a request that already went through sync_watches()
+_synced: ContextVar[bool] = ContextVar("scope_watches_synced", default=False)
+
+def _refresh_watches():
+    for watch in _watches:
+        watch._refresh()
+
+async def sync_watches():
+    """Refreshes every ScopeWatch in a thread, once per request."""
+    if _synced.get():
+        return
+    await asyncio.to_thread(_refresh_watches)
+    _synced.set(True)
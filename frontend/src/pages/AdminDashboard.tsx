@@ -45,8 +45,15 @@ const AdminDashboard: React.FC = () => {
 
     const fetchUsers = async () => {
         try {
-            const response = await api.get('/admin/users');
-            setUsers(response.data);
+            // Paginated by id: follow X-Next-Cursor until the last page
+            const allUsers: User[] = [];
+            let after: string | undefined;
+            do {
+                const response = await api.get('/admin/users', { params: { after } });
+                allUsers.push(...response.data);
+                after = response.headers['x-next-cursor'];
+            } while (after);
+            setUsers(allUsers);
         } catch (err) {
             console.error('Error fetching users', err);
         }